@@ -0,0 +1,237 @@
+"""Benchmarks for parsing and proving.
+
+Replays cases/inputN.txt and checks the answers against cases/outputN.txt,
+then generates synthetic knowledge bases of increasing size and times
+parse_input, prove_by_resolution and the whole pipeline on them. Results are
+printed as a table and can be written as JSON to compare commits:
+
+    python3 bench.py -o before.json
+    python3 bench.py -o after.json --compare before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import *
+import realityman
+from realityman import KnowledgeBase, parse_input, prove_by_resolution
+
+# A generated workload: query strings, sentence strings, expected answers
+Workload = Tuple[List[str], List[str], List[str]]
+
+
+def horn_chain(n: int) -> Workload:
+    """P0(C0) and P0 -> P1 -> ... -> Pn; proving Pn(C0) takes n steps."""
+    sentences = ["P0(C0)"]
+    sentences += ["~P%d(x) | P%d(x)" % (i, i + 1) for i in range(n)]
+    return ["P%d(C0)" % n, "P%d(C1)" % n], sentences, ["TRUE", "FALSE"]
+
+
+def fan_out(n: int) -> Workload:
+    """n rules sharing one body literal, so every step has n partners."""
+    sentences = ["Base(C%d)" % i for i in range(n)]
+    sentences += ["~Base(x) | Q%d(x)" % i for i in range(n)]
+    queries = ["Q%d(C%d)" % (n - 1, n // 2), "Q0(D0)"]
+    return queries, sentences, ["TRUE", "FALSE"]
+
+
+def many_constants(n: int) -> Workload:
+    """A chain of n ground Edge facts under a one-step Link rule."""
+    sentences = ["Edge(C%d,C%d)" % (i, i + 1) for i in range(n)]
+    sentences.append("~Edge(x,y) | Link(y,x)")
+    queries = ["Link(C%d,C%d)" % (n, n - 1), "Link(C0,C%d)" % n]
+    return queries, sentences, ["TRUE", "FALSE"]
+
+
+def non_horn(n: int) -> Workload:
+    """n independent case splits A_i | B_i that each lead to Goal."""
+    sentences = []
+    for i in range(n):
+        sentences.append("A%d(x) | B%d(x)" % (i, i))
+        sentences.append("~A%d(x) | G%d(x)" % (i, i))
+        sentences.append("~B%d(x) | G%d(x)" % (i, i))
+        sentences.append("~G%d(x) | Goal(x)" % i)
+    return ["Goal(Kim)", "G0(Kim)", "A0(Kim)"], sentences, \
+        ["TRUE", "TRUE", "FALSE"]
+
+
+GENERATORS: Dict[str, Callable[[int], Workload]] = {
+    "horn_chain": horn_chain,
+    "fan_out": fan_out,
+    "many_constants": many_constants,
+    "non_horn": non_horn,
+}
+
+
+def write_input(path: str, queries: List[str], sentences: List[str]) -> None:
+    with open(path, "w") as f:
+        f.write("%d\n" % len(queries))
+        for q in queries:
+            f.write(q + "\n")
+        f.write("%d\n" % len(sentences))
+        for s in sentences:
+            f.write(s + "\n")
+
+
+def best_of(repeat: int, fn: Callable[..., Any],
+            setup: Optional[Callable[[], Any]] = None) -> Tuple[float, Any]:
+    """Best wall time of repeat calls, and the value of the last one. With
+    setup, each call gets a fresh value of it, made outside the timing."""
+    best = float("inf")
+    value = None
+    for _ in range(repeat):
+        # The engine reports its progress on stdout
+        with contextlib.redirect_stdout(io.StringIO()):
+            args = (setup(),) if setup is not None else ()
+            start = time.perf_counter()
+            value = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def run_workload(path: str, expected: List[str], repeat: int,
+                 cutoff: int) -> Dict[str, Any]:
+    """Time the phases on one input file and check its answers."""
+    parse_s, (queries, k_base) = best_of(repeat, lambda: parse_input(path))
+    compile_s, _ = best_of(repeat, lambda: KnowledgeBase(k_base))
+
+    def prove_all(kb):
+        return [prove_by_resolution(kb, q, cutoff=cutoff).answer.value
+                for q in queries]
+
+    # A KB keeps its SLD tables and materialized relations, so each repeat
+    # proves on a freshly compiled one
+    prove_s, answers = best_of(repeat, prove_all,
+                               lambda: KnowledgeBase(k_base))
+
+    def pipeline():
+        qs, compiled, _ = KnowledgeBase.from_file(path)
+        return [compiled.prove(q, cutoff=cutoff) for q in qs]
+
+    pipeline_s, _ = best_of(repeat, pipeline)
+    return {
+        "sentences": len(k_base),
+        "queries": len(queries),
+        "parse_s": parse_s,
+        "compile_s": compile_s,
+        "prove_s": prove_s,
+        "pipeline_s": pipeline_s,
+        "answers": answers,
+        "ok": answers == expected,
+    }
+
+
+def replay_cases(repeat: int, cutoff: int) -> List[Dict[str, Any]]:
+    results = []
+    index = 1
+    while os.path.exists("cases/input%d.txt" % index):
+        with open("cases/output%d.txt" % index) as f:
+            expected = f.read().split()
+        result = run_workload("cases/input%d.txt" % index, expected, repeat,
+                              cutoff)
+        result.update({"suite": "cases", "name": "input%d" % index,
+                       "size": result["sentences"]})
+        results.append(result)
+        index += 1
+    return results
+
+
+def run_synthetic(names: List[str], sizes: List[int], repeat: int,
+                  cutoff: int) -> List[Dict[str, Any]]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in names:
+            for size in sizes:
+                queries, sentences, expected = GENERATORS[name](size)
+                path = os.path.join(tmp, "%s_%d.txt" % (name, size))
+                write_input(path, queries, sentences)
+                result = run_workload(path, expected, repeat, cutoff)
+                result.update({"suite": "synthetic", "name": name,
+                               "size": size})
+                results.append(result)
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results: List[Dict[str, Any]],
+                baseline: Optional[Dict[Tuple[str, str, int], Dict]]) -> None:
+    header = "%-10s %-16s %7s %10s %10s %10s %10s  %s" % (
+        "suite", "name", "size", "parse", "compile", "prove", "pipeline",
+        "answers")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        line = "%-10s %-16s %7d %9.4fs %9.4fs %9.4fs %9.4fs  %s" % (
+            r["suite"], r["name"], r["size"], r["parse_s"], r["compile_s"],
+            r["prove_s"], r["pipeline_s"], "ok" if r["ok"] else "WRONG")
+        old = baseline.get((r["suite"], r["name"], r["size"])) \
+            if baseline else None
+        if old and old["pipeline_s"] > 0:
+            line += "  (pipeline x%.2f)" % (r["pipeline_s"] /
+                                             old["pipeline_s"])
+        print(line)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10, 100, 1000],
+                        help="synthetic KB sizes (default: %(default)s)")
+    parser.add_argument("--generators", nargs="+", choices=sorted(GENERATORS),
+                        default=sorted(GENERATORS),
+                        help="synthetic workloads to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per measurement, best one is kept "
+                             "(default: %(default)s)")
+    parser.add_argument("--cutoff", type=int, default=10 ** 6,
+                        help="given sentences per query before giving up "
+                             "(default: %(default)s)")
+    parser.add_argument("--no-cases", action="store_true",
+                        help="skip replaying cases/")
+    parser.add_argument("-o", "--output", help="write results as JSON here")
+    parser.add_argument("--compare", metavar="JSON",
+                        help="earlier results to report speedups against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = []
+    if not args.no_cases:
+        # Under the engine's default cutoff, as the command line runs them
+        results += replay_cases(args.repeat, realityman.CUTOFF)
+    results += run_synthetic(args.generators, args.sizes, args.repeat,
+                             args.cutoff)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(r["suite"], r["name"], r["size"]): r
+                        for r in json.load(f)["results"]}
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(),
+                       "python": platform.python_version(),
+                       "created": time.time(),
+                       "results": results}, f, indent=1)
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
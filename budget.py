@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+from enum import Enum
+from typing import *
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+class Answer(Enum):
+    TRUE = "TRUE"
+    FALSE = "FALSE"
+    UNKNOWN = "UNKNOWN"  # A budget ran out before the search settled
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class ProofResult(NamedTuple):
+    """Answer to a query, for UNKNOWN which budget ran out, and what
+    answered it: "resolution" (the given-clause loop), "sld", "datalog",
+    "facts" or "lemmas"."""
+    answer: Answer
+    reason: Optional[str] = None
+    engine: str = "resolution"
+
+    def __bool__(self) -> bool:
+        return self.answer is Answer.TRUE
+
+    @classmethod
+    def settled(cls, proven: bool, engine: str = "resolution"
+                ) -> "ProofResult":
+        return cls(Answer.TRUE if proven else Answer.FALSE, engine=engine)
+
+
+def resident_memory() -> Optional[int]:
+    """Resident set size of this process in bytes, or its peak where the
+    current size is not available, or None if neither is."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    return None
+
+
+class BudgetExhausted(Exception):
+    """Raised by engines that cannot simply return when a budget runs out."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Budget:
+    """Limits on one proof attempt; None means unlimited.
+
+    given bounds the given sentences processed, seconds the wall time,
+    clauses the resolvents generated and memory the resident set size in
+    bytes. exhausted() is meant to be called once per given sentence, so it
+    only reads the clock and counters; memory is sampled every
+    memory_every given sentences."""
+
+    def __init__(self, given: Optional[int] = None,
+                 seconds: Optional[float] = None,
+                 clauses: Optional[int] = None,
+                 memory: Optional[int] = None,
+                 memory_every: int = 64) -> None:
+        self.given = given
+        self.seconds = seconds
+        self.clauses = clauses
+        self.memory = memory
+        self.memory_every = memory_every
+        self.deadline = time.perf_counter() + seconds \
+            if seconds is not None else None
+
+    def out_of_time(self) -> bool:
+        """Is the deadline past? Cheap enough to ask within a given
+        sentence."""
+        return self.deadline is not None and \
+            time.perf_counter() >= self.deadline
+
+    def exhausted(self, given: int, generated: int) -> Optional[str]:
+        """Why the budget is used up after this much work, or None."""
+        if self.given is not None and given >= self.given:
+            return "%d given sentences processed" % given
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            return "time limit of %gs reached" % self.seconds
+        if self.clauses is not None and generated >= self.clauses:
+            return "%d sentences generated" % generated
+        if self.memory is not None and given % self.memory_every == 0:
+            rss = resident_memory()
+            if rss is not None and rss >= self.memory:
+                return "resident memory reached %d MB" % (rss >> 20)
+        return None
@@ -1,3 +1,5 @@
 rm graphs/*
 rm match_logs/*
 rm output/*
+rm profiles/*
+rm snapshots/*
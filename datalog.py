@@ -0,0 +1,367 @@
+from typing import *
+from budget import Budget, BudgetExhausted
+from terms import Parameter, Literal, Sentence
+
+try:
+    import numpy as np
+except ImportError:  # Materialization is an optional engine
+    np = None
+
+# An atom's arguments as a pattern: a symbol id for a constant, or the
+# variable itself
+Pattern = Tuple[Union[int, Parameter], ...]
+
+# Body atoms as (predicate, pattern); the head is None for a constraint
+Rule = Tuple[Optional[Tuple[int, Pattern]], Tuple[Tuple[int, Pattern], ...]]
+
+
+def _pattern(literal: Literal) -> Pattern:
+    return tuple([p if p.is_var else p.id for p in literal.parameters])
+
+
+def _variables(pattern: Pattern) -> List[Parameter]:
+    return list(dict.fromkeys([p for p in pattern
+                               if isinstance(p, Parameter)]))
+
+
+def _empty(arity: int) -> "np.ndarray":
+    return np.empty((0, arity), dtype=np.int64)
+
+
+def _encode(rows: "np.ndarray", radix: int) -> "np.ndarray":
+    keys = rows[:, 0].copy()
+    for column in range(1, rows.shape[1]):
+        keys *= radix
+        keys += rows[:, column]
+    return keys
+
+
+def _radix(rows: "np.ndarray") -> Optional[int]:
+    """A radix under which every row of rows encodes to a distinct int64,
+    or None if the rows are too wide for that."""
+    radix = int(rows.max()) + 1 if rows.size else 1
+    if radix ** rows.shape[1] >= 1 << 62:
+        return None
+    return radix
+
+
+def _row_keys(*tables: "np.ndarray") -> List["np.ndarray"]:
+    """One integer per row, equal exactly when the rows are equal, numbered
+    consistently across the given tables."""
+    if tables[0].shape[1] == 1:
+        return [t[:, 0] for t in tables]
+    stacked = np.vstack(tables)
+    radix = _radix(stacked)
+    if radix is not None:
+        keys = _encode(stacked, radix)
+    else:
+        _, keys = np.unique(stacked, axis=0, return_inverse=True)
+        keys = keys.reshape(-1)
+    split = []
+    start = 0
+    for t in tables:
+        split.append(keys[start:start + len(t)])
+        start += len(t)
+    return split
+
+
+def _unique_rows(rows: "np.ndarray") -> "np.ndarray":
+    if len(rows) < 2:
+        return rows
+    _, first = np.unique(_row_keys(rows)[0], return_index=True)
+    return rows[first]
+
+
+def _difference(rows: "np.ndarray", old: Optional["np.ndarray"]):
+    """Rows of rows that are not in old."""
+    if old is None or not len(old) or not len(rows):
+        return rows
+    new_keys, old_keys = _row_keys(rows, old)
+    return rows[~np.isin(new_keys, old_keys)]
+
+
+def _join_indices(left: "np.ndarray", right: "np.ndarray"):
+    """Index pairs of the rows of left and right with equal keys."""
+    if left.shape[1] == 0:  # Cartesian product
+        return (np.repeat(np.arange(len(left)), len(right)),
+                np.tile(np.arange(len(right)), len(left)))
+    left_keys, right_keys = _row_keys(left, right)
+    order = np.argsort(right_keys, kind="stable")
+    sorted_keys = right_keys[order]
+    lo = np.searchsorted(sorted_keys, left_keys, side="left")
+    hi = np.searchsorted(sorted_keys, left_keys, side="right")
+    counts = hi - lo
+    left_index = np.repeat(np.arange(len(left)), counts)
+    # Position of each output row within its run of equal right keys
+    offsets = np.arange(len(left_index)) - np.repeat(np.cumsum(counts) -
+                                                     counts, counts)
+    return left_index, order[np.repeat(lo, counts) + offsets]
+
+
+def _clause(sentence: Sentence, arities: Dict[int, int]) -> Optional[Rule]:
+    """sentence as a rule, a fact being a rule without body atoms, or None
+    if it is not a range-restricted Horn clause over the predicate arities
+    in arities, which records those of its own predicates."""
+    head = None
+    body = []
+    for lit in sentence.disjoint_literals:
+        if arities.setdefault(lit.predicate, len(lit.parameters)) != \
+                len(lit.parameters):
+            return None
+        atom = (lit.predicate, _pattern(lit))
+        if lit.negated:
+            body.append(atom)
+        elif head is not None:
+            return None  # Not Horn
+        else:
+            head = atom
+    if not body:
+        if not sentence.contains_only_constants():
+            return None
+        return head, ()
+    bound = {v for _, pattern in body for v in _variables(pattern)}
+    if head is not None and not set(_variables(head[1])) <= bound:
+        return None
+    return head, tuple(body)
+
+
+def _select(pattern: Pattern, rows: "np.ndarray"):
+    """Rows matching the constants and repeated variables of pattern,
+    projected onto one column per distinct variable."""
+    mask = None
+    first: Dict[Parameter, int] = {}
+    for i, p in enumerate(pattern):
+        if isinstance(p, Parameter):
+            if p not in first:
+                first[p] = i
+                continue
+            test = rows[:, i] == rows[:, first[p]]
+        else:
+            test = rows[:, i] == p
+        mask = test if mask is None else mask & test
+    if mask is not None:
+        rows = rows[mask]
+    return rows[:, list(first.values())], list(first)
+
+
+class DatalogProgram:
+    """Bottom-up evaluation of a function-free, range-restricted Horn
+    knowledge base: ground facts, and rules whose head variables all occur
+    in their body.
+
+    The facts of each predicate are a NumPy array of symbol ids, one row per
+    fact. Rule bodies are evaluated as relational joins over whole arrays,
+    semi-naively: each round only fires rules with at least one body atom
+    matched against the facts new in the previous round. Queries are then
+    lookups in the materialized relations. Constraints (sentences without a
+    positive literal) are kept aside to answer negated queries."""
+
+    def __init__(self, facts: Dict[int, "np.ndarray"],
+                 rules: List[Rule]) -> None:
+        self.base = facts
+        self.rules = [rule for rule in rules if rule[0] is not None]
+        self.constraints = [body for head, body in rules if head is None]
+        self.relations: Optional[Dict[int, "np.ndarray"]] = None
+        # Sorted row encodings of materialized relations, built on demand to
+        # answer ground queries by binary search
+        self._lookup: Dict[int, Tuple[int, "np.ndarray"]] = {}
+
+    @classmethod
+    def compile(cls, sentences: Iterable[Sentence]
+                ) -> Optional["DatalogProgram"]:
+        """The program for sentences, or None if NumPy is missing or the
+        sentences are not range-restricted Horn clauses."""
+        if np is None:
+            return None
+        facts: Dict[int, List[Pattern]] = {}
+        rules: List[Rule] = []
+        arities: Dict[int, int] = {}
+        for sentence in sentences:
+            rule = _clause(sentence, arities)
+            if rule is None:
+                return None
+            head, body = rule
+            if body:
+                rules.append(rule)
+            else:
+                facts.setdefault(head[0], []).append(head[1])
+        arrays = {predicate: _unique_rows(np.array(rows, dtype=np.int64))
+                  for predicate, rows in facts.items()}
+        for predicate, arity in arities.items():
+            if predicate not in arrays:
+                arrays[predicate] = _empty(arity)
+        return cls(arrays, rules)
+
+    def add(self, sentence: Sentence) -> bool:
+        """Add a clause to the program, extending the materialized relations
+        by what it derives if they exist. Returns False, leaving the program
+        unchanged, if the clause does not fit in a Datalog program."""
+        arities = {predicate: rows.shape[1]
+                   for predicate, rows in self.base.items()}
+        rule = _clause(sentence, arities)
+        if rule is None:
+            return False
+        for predicate, arity in arities.items():
+            if predicate not in self.base:
+                self.base[predicate] = _empty(arity)
+                if self.relations is not None:
+                    self.relations[predicate] = _empty(arity)
+        head, body = rule
+        if head is None:
+            self.constraints.append(body)
+            return True
+        predicate, pattern = head
+        if body:
+            self.rules.append(rule)
+            if self.relations is None:
+                return True
+            # The new rule fires once against everything, then joins the
+            # semi-naive rounds
+            rows = self._fire(pattern, body,
+                              [self.relations[p] for p, _ in body])
+        else:
+            rows = np.array([pattern], dtype=np.int64)
+            self.base[predicate] = np.vstack([
+                self.base[predicate],
+                _difference(rows, self.base[predicate])])
+            if self.relations is None:
+                return True
+        rows = _difference(_unique_rows(rows), self.relations[predicate])
+        if len(rows):
+            self.relations[predicate] = np.vstack([self.relations[predicate],
+                                                   rows])
+            self._fixpoint(self.relations, {predicate: rows}, None)
+            self._lookup.clear()
+        return True
+
+    @property
+    def size(self) -> int:
+        """Number of facts, derived ones included once materialized."""
+        relations = self.relations if self.relations is not None \
+            else self.base
+        return sum([len(rows) for rows in relations.values()])
+
+    def fact_heavy(self, facts: int, per_rule: int) -> bool:
+        """Does the program start out with at least facts facts, and at
+        least per_rule of them per rule and constraint?"""
+        count = sum([len(rows) for rows in self.base.values()])
+        return count >= facts and \
+            count >= per_rule * (len(self.rules) + len(self.constraints))
+
+    def materialize(self, budget: Optional[Budget] = None) -> None:
+        if self.relations is None:
+            relations = dict(self.base)
+            self._fixpoint(relations, dict(self.base), budget)
+            self.relations = relations
+
+    def _fixpoint(self, relations: Dict[int, "np.ndarray"],
+                  delta: Dict[int, "np.ndarray"],
+                  budget: Optional[Budget]) -> None:
+        """Extend relations, which already hold delta, by everything the
+        rules derive from it. Arrays are replaced, never modified, so a
+        shallow copy of relations can be extended independently."""
+        rounds = 0
+        derived_facts = 0
+        while delta:
+            rounds += 1
+            if budget is not None:
+                reason = budget.exhausted(rounds, derived_facts)
+                if reason is not None:
+                    raise BudgetExhausted(reason)
+            derived: Dict[int, List["np.ndarray"]] = {}
+            for (predicate, pattern), body in self.rules:
+                for i, (atom_predicate, _) in enumerate(body):
+                    new = delta.get(atom_predicate)
+                    if new is None or not len(new):
+                        continue
+                    tables = [new if j == i else relations[p]
+                              for j, (p, _) in enumerate(body)]
+                    rows = self._fire(pattern, body, tables)
+                    if len(rows):
+                        derived.setdefault(predicate, []).append(rows)
+            delta = {}
+            for predicate, chunks in derived.items():
+                rows = _difference(_unique_rows(np.vstack(chunks)),
+                                   relations[predicate])
+                if len(rows):
+                    derived_facts += len(rows)
+                    delta[predicate] = rows
+                    relations[predicate] = np.vstack([relations[predicate],
+                                                      rows])
+
+    @staticmethod
+    def _join(body, tables) -> Tuple["np.ndarray", Dict[Parameter, int]]:
+        """All variable bindings satisfying body, one row per binding, and
+        the column of each variable."""
+        bindings = np.zeros((1, 0), dtype=np.int64)
+        columns: Dict[Parameter, int] = {}
+        for (_, pattern), rows in zip(body, tables):
+            rows, variables = _select(pattern, rows)
+            shared = [i for i, v in enumerate(variables) if v in columns]
+            left, right = _join_indices(
+                bindings[:, [columns[variables[i]] for i in shared]],
+                rows[:, shared])
+            fresh = [i for i, v in enumerate(variables) if v not in columns]
+            for i in fresh:
+                columns[variables[i]] = bindings.shape[1] + fresh.index(i)
+            bindings = np.hstack([bindings[left], rows[right][:, fresh]])
+            if not len(bindings):
+                break
+        return bindings, columns
+
+    def _fire(self, head: Pattern, body, tables) -> "np.ndarray":
+        bindings, columns = self._join(body, tables)
+        if not len(bindings):
+            return _empty(len(head))
+        return np.stack([bindings[:, columns[p]] if isinstance(p, Parameter)
+                         else np.full(len(bindings), p, dtype=np.int64)
+                         for p in head], axis=1)
+
+    def holds(self, atom: Literal, budget: Optional[Budget] = None) -> bool:
+        """Does some instance of the positive literal atom follow?"""
+        self.materialize(budget)
+        rows = self.relations.get(atom.predicate)
+        if rows is None or rows.shape[1] != len(atom.parameters):
+            return False
+        if not atom.contains_only_constants() or not len(rows):
+            return len(_select(_pattern(atom), rows)[0]) > 0
+
+        lookup = self._lookup.get(atom.predicate)
+        if lookup is None:
+            radix = _radix(rows)
+            if radix is None:
+                return len(_select(_pattern(atom), rows)[0]) > 0
+            lookup = self._lookup[atom.predicate] = \
+                (radix, np.sort(_encode(rows, radix)))
+        radix, keys = lookup
+        ids = [p.id for p in atom.parameters]
+        if max(ids) >= radix:  # A constant the relation does not mention
+            return False
+        key = 0
+        for i in ids:
+            key = key * radix + i
+        position = int(np.searchsorted(keys, key))
+        return position < len(keys) and int(keys[position]) == key
+
+    def violated_with(self, fact: Literal,
+                      budget: Optional[Budget] = None) -> bool:
+        """Would adding the ground positive literal fact make a constraint
+        fail? The materialized relations are extended on a copy."""
+        self.materialize(budget)
+        if fact.predicate not in self.relations or \
+                self.relations[fact.predicate].shape[1] != \
+                len(fact.parameters):
+            return False
+        row = np.array([_pattern(fact)], dtype=np.int64)
+        relations = dict(self.relations)
+        delta = {fact.predicate: _difference(row,
+                                             relations[fact.predicate])}
+        if len(delta[fact.predicate]):
+            relations[fact.predicate] = np.vstack([relations[fact.predicate],
+                                                   row])
+            self._fixpoint(relations, delta, budget)
+        for body in self.constraints:
+            tables = [relations[p] for p, _ in body]
+            if len(self._join(body, tables)[0]):
+                return True
+        return False
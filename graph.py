@@ -1,38 +1,128 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import *
 from graphviz import Digraph
 
+# Graphs are laid out and rendered off the proving path, one at a time
+_RENDERER: Optional[ThreadPoolExecutor] = None
+
+
+def _renderer() -> ThreadPoolExecutor:
+    global _RENDERER
+    if _RENDERER is None:
+        _RENDERER = ThreadPoolExecutor(1, thread_name_prefix="graph-render")
+    return _RENDERER
+
+
+def wait_renders() -> None:
+    """Block until every graph handed to save() has been written."""
+    global _RENDERER
+    if _RENDERER is not None:
+        _RENDERER.shutdown(wait=True)
+        _RENDERER = None
+
 
 class ResolutionGraph:
-    def __init__(self, file_num, query_num=1):
+    """Resolution steps of one query.
+
+    During the search a step only costs a few dict lookups: sentences become
+    dense node ids and steps (parent, parent, child) id triples. The graphviz
+    graph is built when saving, on a background thread, either from every
+    step or, with proof_only, from just the derivation of the empty clause."""
+
+    def __init__(self, file_num, query_num=1, proof_only=False, fmt="png"):
         self.query_num = query_num
-        self.new = True
-        self.graph = Digraph(comment='Resolution Graph', format="png")
         self.file_num = file_num
+        self.proof_only = proof_only
+        self.format = fmt
+        self.nodes: List[Any] = []
+        self.edges: List[Tuple[int, int, int]] = []
+        # Parents of the step that first produced a node; nodes first seen
+        # as a parent (KB sentences, the negated query) are leaves
+        self.derivation: Dict[int, Tuple[int, int]] = {}
+        self.root: Optional[int] = None
+        self.empty: Optional[int] = None
+        self._ids: Dict[Any, int] = {}
 
     def next_query(self):
-        return ResolutionGraph(self.file_num, self.query_num + 1)
+        return ResolutionGraph(self.file_num, self.query_num + 1,
+                               self.proof_only, self.format)
 
-    def add(self, parent1, parent2, child):
-        p1 = str(parent1)
-        p2 = str(parent2)
+    def _node(self, sentence) -> int:
+        node = self._ids.get(sentence)
+        if node is None:
+            node = self._ids[sentence] = len(self.nodes)
+            self.nodes.append(sentence)
+        return node
 
-        if self.new:
-            self.new = False
-            if p1[0] == "~":
-                self.graph.node(p1, shape="doublecircle", color="blue")
-            else:
-                self.graph.node(p2, shape="doublecircle", color="blue")
+    def set_root(self, sentence):
+        """Mark sentence, the negated query, as the root of the search."""
+        self.root = self._node(sentence)
+
+    def add(self, parent1, parent2, child):
+        p1 = self._node(parent1)
+        p2 = self._node(parent2)
+        c = self._ids.get(child)
+        if c is None:
+            c = self._node(child)
+            self.derivation[c] = (p1, p2)
+            if not child:
+                self.empty = c
+        self.edges.append((p1, p2, c))
 
-        if child:
-            c = str(child)
-            self.graph.node(c)
-        else:
-            c = "{}"
-            self.graph.node(c, shape='star', color="red")
+    def proof(self) -> List[Tuple[int, int, int]]:
+        """Steps deriving the empty clause, parents first, or none if it was
+        never derived."""
+        steps = []
+        stack = [self.empty] if self.empty is not None else []
+        seen = set()
+        while stack:
+            node = stack.pop()
+            parents = self.derivation.get(node)
+            if parents is None or node in seen:
+                continue
+            seen.add(node)
+            steps.append(parents + (node,))
+            stack.extend(parents)
+        # Parents always have smaller ids than the node they first produced
+        steps.sort(key=lambda step: step[2])
+        return steps
 
-        self.graph.edge(p1, c)
-        self.graph.edge(p2, c)
+    def to_digraph(self) -> Digraph:
+        edges = self.proof() if self.proof_only else self.edges
+        graph = Digraph(comment='Resolution Graph', format=self.format)
+        drawn = set()
+        for step in edges:
+            for node in step:
+                if node in drawn:
+                    continue
+                drawn.add(node)
+                if node == self.empty:
+                    graph.node("{}", shape='star', color="red")
+                elif node == self.root:
+                    graph.node(str(self.nodes[node]), shape="doublecircle",
+                               color="blue")
+                else:
+                    graph.node(str(self.nodes[node]))
+            p1, p2, c = [str(self.nodes[node]) if node != self.empty
+                         else "{}" for node in step]
+            graph.edge(p1, c)
+            if p2 != p1:  # Factors have a single parent
+                graph.edge(p2, c)
+        return graph
 
     def save(self):
         path = 'graphs/input%dquery%d' % (self.file_num, self.query_num)
         print("[!] Saving resolution graph to:", path)
-        self.graph.render(path, view=False)
+        _renderer().submit(self._write, path)
+
+    def _write(self, path):
+        try:
+            graph = self.to_digraph()
+            if self.format == "dot":
+                graph.save(path + ".dot")
+            else:
+                graph.render(path, view=False)
+        except Exception as e:
+            print("[!] Could not save resolution graph %s: %s" % (path, e),
+                  file=sys.stderr)
@@ -0,0 +1,175 @@
+from typing import *
+from terms import apart_variable
+from unify import rename_variables, unify
+
+# A literal's index key: its interned predicate id and polarity
+Key = Tuple[int, bool]
+
+
+class PredicateIndex:
+    """Maps (predicate, negated) to the ids of clauses containing such a
+    literal, so resolution partners can be looked up instead of scanned."""
+
+    def __init__(self) -> None:
+        # Dicts are used as insertion ordered sets for O(1) removal
+        self.postings: Dict[Key, Dict[int, None]] = {}
+
+    def add(self, clause_id: int, sentence) -> None:
+        for lit in sentence.disjoint_literals:
+            key = (lit.predicate, lit.negated)
+            ids = self.postings.get(key)
+            if ids is None:
+                ids = self.postings[key] = {}
+            ids[clause_id] = None
+
+    def remove(self, clause_id: int, sentence) -> None:
+        for lit in sentence.disjoint_literals:
+            ids = self.postings.get((lit.predicate, lit.negated))
+            if ids is not None:
+                ids.pop(clause_id, None)
+
+    def lookup(self, predicate: int, negated: bool) -> Iterable[int]:
+        return self.postings.get((predicate, negated), ())
+
+
+def _linear(literal) -> bool:
+    """True if no variable occurs twice among the arguments."""
+    seen = set()
+    for p in literal.parameters:
+        if p.is_var:
+            if p in seen:
+                return False
+            seen.add(p)
+    return True
+
+
+def _matches(general, specific) -> bool:
+    """One-way matching of flat argument lists."""
+    binding = {}
+    for p, t in zip(general.parameters, specific.parameters):
+        if p.is_var:
+            if binding.setdefault(p, t) is not t:
+                return False
+        elif p is not t:
+            return False
+    return True
+
+
+# Retrieval modes of DiscriminationTree
+UNIFIABLE, GENERALIZATIONS, INSTANCES = range(3)
+
+
+class DiscriminationTree:
+    """Literals of stored clauses, indexed by the path of their predicate,
+    polarity and arity followed by each argument: a constant's id, or None
+    for any variable.
+
+    Terms are flat, so a path has one step per argument. Retrieval follows a
+    constant's own branch and the variable branch, and a variable follows
+    every branch it can bind to. Paths are exact for literals without
+    repeated variables; the others are checked once they are reached."""
+
+    def __init__(self) -> None:
+        self.root: Dict[Tuple[int, bool, int], Dict] = {}
+        # Leaves map each stored literal to the ids of clauses holding it
+        self._nonlinear: Set[Any] = set()
+
+    def _path(self, literal) -> List:
+        return [None if p.is_var else p.id for p in literal.parameters]
+
+    def add(self, clause_id: int, sentence) -> None:
+        for lit in sentence.disjoint_literals:
+            node = self.root.setdefault(
+                (lit.predicate, lit.negated, len(lit.parameters)), {})
+            for step in self._path(lit):
+                node = node.setdefault(step, {})
+            node.setdefault(lit, {})[clause_id] = None
+            if not _linear(lit):
+                self._nonlinear.add(lit)
+
+    def remove(self, clause_id: int, sentence) -> None:
+        for lit in sentence.disjoint_literals:
+            key = (lit.predicate, lit.negated, len(lit.parameters))
+            nodes = [(self.root, key)]
+            node = self.root.get(key)
+            for step in self._path(lit):
+                if node is None:
+                    break
+                nodes.append((node, step))
+                node = node.get(step)
+            if node is None or lit not in node:
+                continue
+            ids = node[lit]
+            ids.pop(clause_id, None)
+            if ids:
+                continue
+            del node[lit]
+            self._nonlinear.discard(lit)
+            # Prune the branches left empty
+            for parent, step in reversed(nodes):
+                if parent[step]:
+                    break
+                del parent[step]
+
+    def _retrieve(self, literal, mode: int) -> List[Tuple[Any, Dict[int, None]]]:
+        node = self.root.get((literal.predicate, literal.negated,
+                              len(literal.parameters)))
+        if node is None:
+            return []
+        nodes = [node]
+        for p in literal.parameters:
+            following = []
+            for node in nodes:
+                if p.is_var:
+                    if mode == GENERALIZATIONS:
+                        child = node.get(None)
+                        if child is not None:
+                            following.append(child)
+                    else:
+                        following.extend(node.values())
+                else:
+                    child = node.get(p.id)
+                    if child is not None:
+                        following.append(child)
+                    if mode != INSTANCES:
+                        child = node.get(None)
+                        if child is not None:
+                            following.append(child)
+            nodes = following
+            if not nodes:
+                return []
+
+        query_linear = _linear(literal)
+        results = []
+        for leaf in nodes:
+            for stored, ids in leaf.items():
+                if mode == UNIFIABLE:
+                    if not (query_linear and stored not in self._nonlinear) \
+                            and not _unifiable(literal, stored):
+                        continue
+                elif mode == GENERALIZATIONS:
+                    if stored in self._nonlinear and \
+                            not _matches(stored, literal):
+                        continue
+                elif not query_linear and not _matches(literal, stored):
+                    continue
+                results.append((stored, ids))
+        return results
+
+    def unifiable(self, literal) -> List[Tuple[Any, Dict[int, None]]]:
+        """Stored literals unifiable with literal, with their clause ids."""
+        return self._retrieve(literal, UNIFIABLE)
+
+    def generalizations(self, literal) -> List[Tuple[Any, Dict[int, None]]]:
+        """Stored literals that match onto literal, with their clause ids."""
+        return self._retrieve(literal, GENERALIZATIONS)
+
+    def instances(self, literal) -> List[Tuple[Any, Dict[int, None]]]:
+        """Stored literals literal matches onto, with their clause ids."""
+        return self._retrieve(literal, INSTANCES)
+
+
+def _unifiable(literal, stored) -> bool:
+    # The two literals may use the same variable names
+    apart = rename_variables([literal], apart_variable)[0]
+    return unify(apart, stored) is not None
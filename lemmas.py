@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from typing import *
+from terms import Literal, Sentence
+
+
+class LemmaCache:
+    """Bounded LRU cache of settled ground queries against one knowledge base.
+
+    Literals are interned and hashed structurally, so a parsed query is its
+    own canonical key. Only definite answers belong here: True when the query
+    was proven, False when its refutation attempt saturated. Answers cut off
+    by a search limit are not settled and must not be cached.
+
+    A proven query is a consequence of the knowledge base, so with
+    remember_units the cached positives are also offered to later proofs as
+    extra unit premises."""
+
+    def __init__(self, maxsize: int = 1024,
+                 remember_units: bool = False) -> None:
+        if maxsize < 1:
+            raise ValueError("Lemma cache size must be positive")
+        self.maxsize = maxsize
+        self.remember_units = remember_units
+        self._entries: "OrderedDict[Literal, bool]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, query: Literal) -> Optional[bool]:
+        proven = self._entries.get(query)
+        if proven is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(query)
+        self.hits += 1
+        return proven
+
+    def put(self, query: Literal, proven: bool) -> None:
+        if not query.contains_only_constants():
+            return
+        self._entries[query] = proven
+        self._entries.move_to_end(query)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def forget_unproven(self) -> None:
+        """Drop the False answers, which sentences added to the knowledge
+        base may overturn; proven queries remain consequences."""
+        for query in [q for q, proven in self._entries.items()
+                      if not proven]:
+            del self._entries[query]
+
+    def units(self) -> List[Sentence]:
+        """Proven queries as unit sentences, most recently used last."""
+        if not self.remember_units:
+            return []
+        return [Sentence.from_literals([query])
+                for query, proven in self._entries.items() if proven]
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
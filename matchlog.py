@@ -0,0 +1,78 @@
+import gzip
+import io
+import os
+from collections import deque
+from enum import IntEnum
+from typing import *
+
+
+class LogLevel(IntEnum):
+    OFF = 0
+    CONTRADICTION = 1  # Only the step deriving the empty clause
+    ALL = 2  # Every resolution step
+
+
+class MatchLog:
+    """Sink for the resolution steps ([TARGET], [MATCH], [RESULT]) of one
+    query.
+
+    Steps are formatted and written through a buffer as they are recorded,
+    optionally gzip compressed, so a long search never holds its log in
+    memory. With last set, only the sentences of the most recent steps are
+    kept and the log is written on close instead. The number of recorded
+    steps closes the file."""
+
+    def __init__(self, path: str, level: LogLevel = LogLevel.ALL,
+                 last: int = 0, compress: bool = False,
+                 buffer_size: int = 1 << 16) -> None:
+        self.level = level
+        self.count = 0
+        self.path = path + ".gz" if compress else path
+        self._ring: Optional[Deque[Tuple[Any, Any, Any]]] = \
+            deque(maxlen=last) if last > 0 else None
+        if compress:
+            raw = io.BufferedWriter(gzip.GzipFile(self.path, "wb"),
+                                    buffer_size)
+            self._file = io.TextIOWrapper(raw)
+        else:
+            self._file = open(self.path, "w", buffering=buffer_size)
+
+    def __enter__(self) -> "MatchLog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def every_step(self) -> bool:
+        return self.level >= LogLevel.ALL
+
+    def record(self, target, match, result) -> None:
+        self.count += 1
+        if self._ring is not None:
+            self._ring.append((target, match, result))
+        else:
+            self._write(target, match, result)
+
+    def _write(self, target, match, result) -> None:
+        self._file.write("[TARGET] " + str(target) + "\n[MATCH] " +
+                         str(match) + "\n[RESULT] " + str(result) + "\n\n")
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        if self._ring is not None:
+            for step in self._ring:
+                self._write(*step)
+            self._file.write("%d matches, last %d shown\n" %
+                             (self.count, len(self._ring)))
+        else:
+            self._file.write("%d matches\n" % self.count)
+        self._file.close()
+
+    def discard(self) -> None:
+        """Close and delete the log, for a query no resolution step was
+        recorded for."""
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,53 @@
+import json
+import time
+from typing import *
+
+# Time spent in each of these accumulates over a whole proof
+PHASES = ("unify", "resolve", "update_kb", "graph")
+
+
+class QueryMetrics:
+    """Counters and phase timings of one proof attempt.
+
+    Passed to prove_by_resolution, which fills it in as it goes; when none is
+    given the engine does no bookkeeping at all."""
+
+    def __init__(self, file_index: Optional[int] = None,
+                 query: Optional[str] = None) -> None:
+        self.file_index = file_index
+        self.query = query
+        self.engine = "resolution"
+        self.answer: Optional[str] = None
+        self.reason: Optional[str] = None
+        self.iterations = 0
+        self.pairs_tried = 0
+        self.unifications = 0
+        self.unifications_failed = 0
+        self.resolvents = 0
+        self.duplicates = 0
+        self.subsumed = 0
+        self.peak_kb = 0
+        self.wall = 0.0
+        self.phases: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+
+    def add_time(self, phase: str, start: float) -> float:
+        """Charge the time since start to phase and return the current time."""
+        now = time.perf_counter()
+        self.phases[phase] += now - start
+        return now
+
+    def to_dict(self) -> Dict[str, Any]:
+        record = {"kind": "query"}
+        record.update(vars(self))
+        record["phases"] = dict(self.phases)
+        return record
+
+    def __repr__(self) -> str:
+        return "QueryMetrics(%r)" % self.to_dict()
+
+
+def write_jsonl(path: str, records: Iterable[Dict[str, Any]]) -> None:
+    """Write one JSON object per line."""
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
@@ -0,0 +1,217 @@
+"""Microbenchmarks for the resolution step.
+
+Times unify_and_resolve (standardizing apart, unification and building the
+canonical resolvents) on clause pairs of growing arity and length, on pairs
+whose literals all cross-match and on pairs that clash on a constant, and
+measures its memory use with tracemalloc. Every pair's resolvents are checked
+against the expected ones, and against those of an earlier run when
+comparing, so allocation-reducing changes can be measured and checked:
+
+    python3 microbench.py -o before.json
+    python3 microbench.py -o after.json --compare before.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import *
+from bench import git_commit
+from realityman import verify
+from terms import Sentence
+from unify import unify_and_resolve
+
+# A clause pair: the two sentence strings and the expected resolvents
+Pair = Tuple[str, str, List[str]]
+
+_VARIABLES = "abcdefghijklmnopqrstuvw"
+
+
+def arity(n: int) -> Pair:
+    """A literal of n variables resolved against its ground complement."""
+    variables = _VARIABLES[:n]
+    return ("P(%s) | Q(a)" % ",".join(variables),
+            "~P(%s)" % ",".join(["C%d" % i for i in range(n)]),
+            ["Q(C0)"])
+
+
+def literals(n: int) -> Pair:
+    """A clause of n + 1 literals resolved upon its first one by a fact."""
+    others = ["P%d(x)" % i for i in range(1, n + 1)]
+    return (" | ".join(["~P0(x)"] + others), "P0(A)",
+            [" | ".join([l.replace("x", "A") for l in others])])
+
+
+def cross(n: int) -> Pair:
+    """n literals against n complementary ones, every pair unifying."""
+    positive = ["P(A%d,x)" % i for i in range(n)]
+    negative = ["~P(y,B%d)" % j for j in range(n)]
+    expected = []
+    for i in range(n):
+        for j in range(n):
+            rest = ["P(A%d,B%d)" % (k, j) for k in range(n) if k != i]
+            rest += ["~P(A%d,B%d)" % (i, k) for k in range(n) if k != j]
+            expected.append(" | ".join(rest))
+    return " | ".join(positive), " | ".join(negative), expected
+
+
+def clash(n: int) -> Pair:
+    """Literals of arity n that only clash on their last constant."""
+    variables = _VARIABLES[:n - 1]
+    return ("P(%s) | Q(x)" % ",".join(list(variables) + ["A"]),
+            "~P(%s)" % ",".join(["C%d" % i for i in range(n - 1)] + ["B"]),
+            [])
+
+
+GENERATORS: Dict[str, Callable[[int], Pair]] = {
+    "arity": arity,
+    "literals": literals,
+    "cross": cross,
+    "clash": clash,
+}
+
+
+def _canonical(sentences: Iterable[Sentence]) -> List[str]:
+    return sorted([str(verify(s)) for s in sentences])
+
+
+def time_per_op(fn: Callable[[], Any], repeat: int,
+                min_time: float = 0.1) -> float:
+    """Best nanoseconds per call of fn over repeat timed loops, each loop
+    running long enough to make the clock's resolution negligible."""
+    number = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_time * 1e9:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter_ns() - start) / number)
+    return best
+
+
+def memory_per_op(fn: Callable[[], Any], number: int = 200
+                  ) -> Tuple[float, float, float]:
+    """Peak bytes traced during one call of fn, and the bytes and blocks
+    still allocated per call once the results of number calls are kept."""
+    fn()  # Interned symbols and cached variables are not the call's
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] - base
+        before = tracemalloc.take_snapshot()
+        kept = [fn() for _ in range(number)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    diff = after.filter_traces(filters).compare_to(
+        before.filter_traces(filters), "filename")
+    size = sum([stat.size_diff for stat in diff])
+    blocks = sum([stat.count_diff for stat in diff])
+    del kept
+    return peak, size / number, blocks / number
+
+
+def run_pair(name: str, size: int, repeat: int) -> Dict[str, Any]:
+    first, second, expected = GENERATORS[name](size)
+    sent1 = Sentence(first)
+    sent2 = Sentence(second)
+
+    def step():
+        return unify_and_resolve(sent1, sent2)
+
+    answers = _canonical(step())
+    ns = time_per_op(step, repeat)
+    peak, kept, blocks = memory_per_op(step)
+    return {
+        "name": name,
+        "size": size,
+        "ns_per_op": ns,
+        "peak_bytes_per_op": peak,
+        "bytes_per_op": kept,
+        "blocks_per_op": blocks,
+        "answers": answers,
+        "ok": answers == _canonical([Sentence(e) for e in expected]),
+    }
+
+
+def print_table(results: List[Dict[str, Any]],
+                baseline: Optional[Dict[Tuple[str, int], Dict]]) -> None:
+    header = "%-10s %5s %12s %12s %10s %10s  %s" % (
+        "name", "size", "ns/op", "peak B/op", "B/op", "blocks/op",
+        "answers")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        line = "%-10s %5d %12.0f %12.0f %10.0f %10.1f  %s" % (
+            r["name"], r["size"], r["ns_per_op"], r["peak_bytes_per_op"],
+            r["bytes_per_op"], r["blocks_per_op"],
+            "ok" if r["ok"] else "WRONG")
+        old = baseline.get((r["name"], r["size"])) if baseline else None
+        if old and old["ns_per_op"] > 0:
+            line += "  (x%.2f time, x%.2f peak)" % (
+                r["ns_per_op"] / old["ns_per_op"],
+                r["peak_bytes_per_op"] / old["peak_bytes_per_op"]
+                if old["peak_bytes_per_op"] else 1.0)
+        print(line)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 8],
+                        help="arities, clause lengths and cross-matched "
+                             "literals (default: %(default)s)")
+    parser.add_argument("--generators", nargs="+", choices=sorted(GENERATORS),
+                        default=sorted(GENERATORS),
+                        help="clause pairs to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="timed loops per pair, best one is kept "
+                             "(default: %(default)s)")
+    parser.add_argument("-o", "--output", help="write results as JSON here")
+    parser.add_argument("--compare", metavar="JSON",
+                        help="earlier results to report speedups against "
+                             "and whose resolvents must be reproduced")
+    args = parser.parse_args(argv)
+    if max(args.sizes) > len(_VARIABLES) or min(args.sizes) < 1:
+        parser.error("sizes must be between 1 and %d" % len(_VARIABLES))
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = [run_pair(name, size, args.repeat)
+               for name in args.generators for size in args.sizes]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(r["name"], r["size"]): r
+                        for r in json.load(f)["results"]}
+        for r in results:
+            old = baseline.get((r["name"], r["size"]))
+            if old is not None and old["answers"] != r["answers"]:
+                r["ok"] = False
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(),
+                       "python": platform.python_version(),
+                       "created": time.time(),
+                       "results": results}, f, indent=1)
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import mmap
+from typing import *
+from terms import Literal, Sentence
+
+
+class ParseError(ValueError):
+    """A malformed line of an input file."""
+
+    def __init__(self, fname: str, lineno: int, message: str,
+                 line: str = "") -> None:
+        self.fname = fname
+        self.lineno = lineno
+        self.line = line
+        text = "%s:%d: %s" % (fname, lineno, message)
+        if line:
+            text += ": %r" % line
+        super().__init__(text)
+
+
+def _lines(f, use_mmap: bool) -> Iterator[bytes]:
+    if use_mmap:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty files cannot be mapped
+            return
+        with mapped:
+            yield from iter(mapped.readline, b"")
+    else:
+        yield from f
+
+
+class InputReader:
+    """Streams an input file: a query count, the queries, a sentence count and
+    the sentences, one per line.
+
+    Lines are decoded and parsed one at a time, with symbols interned as they
+    are read, so only the current line is ever held as text. Malformed lines
+    raise ParseError with the file name and line number."""
+
+    def __init__(self, fname: str, use_mmap: bool = False) -> None:
+        self.fname = fname
+        self._file = open(fname, "rb")
+        self._lines = _lines(self._file, use_mmap)
+        self.lineno = 0
+        # Sentences parsed so far
+        self.count = 0
+
+    def __enter__(self) -> "InputReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._lines.close()
+        self._file.close()
+
+    def _next_line(self, what: str) -> str:
+        try:
+            raw = next(self._lines)
+        except StopIteration:
+            raise ParseError(self.fname, self.lineno + 1,
+                             "unexpected end of file, expected %s" % what)
+        self.lineno += 1
+        try:
+            return raw.decode("utf-8").strip()
+        except UnicodeDecodeError as e:
+            raise ParseError(self.fname, self.lineno, str(e))
+
+    def _count(self, what: str) -> int:
+        line = self._next_line("the number of " + what)
+        try:
+            count = int(line)
+        except ValueError:
+            count = -1
+        if count < 0:
+            raise ParseError(self.fname, self.lineno,
+                             "expected the number of " + what, line)
+        return count
+
+    def _parse(self, parse, what: str, line: str):
+        if not line:
+            raise ParseError(self.fname, self.lineno, "empty " + what)
+        try:
+            return parse(line)
+        except (ValueError, IndexError) as e:
+            raise ParseError(self.fname, self.lineno, str(e), line)
+
+    def queries(self) -> List[Literal]:
+        """Read the query section; must be called before sentences()."""
+        return [self._parse(Literal, "query", self._next_line("a query"))
+                for _ in range(self._count("queries"))]
+
+    def sentences(self) -> Iterator[Sentence]:
+        """Lazily parse the sentence section, closing the file at its end."""
+        try:
+            for _ in range(self._count("sentences")):
+                sentence = self._parse(Sentence, "sentence",
+                                       self._next_line("a sentence"))
+                self.count += 1
+                yield sentence
+        finally:
+            self.close()
+
+
+def read_input(fname: str,
+               use_mmap: bool = False) -> Tuple[List[Literal],
+                                                Iterator[Sentence]]:
+    """The queries of an input file and a lazy iterator over its sentences."""
+    reader = InputReader(fname, use_mmap)
+    try:
+        queries = reader.queries()
+    except BaseException:
+        reader.close()
+        raise
+    return queries, reader.sentences()
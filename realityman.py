@@ -1,170 +1,42 @@
-import copy
+import argparse
+import contextlib
+import cProfile
+import io
+import os
+import pstats
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import *
-from enum import Enum
-from collections import defaultdict
-from graph import ResolutionGraph
-
-
-class UnifStatus(Enum):
-    FAIL = 0
-    SUCCESS = 1
-    MULTI = 2
-    EMPTY = 3
-    INVALID = 4
-
-
-class Parameter:
-    def __init__(self, param_string: str) -> None:
-        self.parse_param(param_string)
-
-    def parse_param(self, param_string: str) -> None:
-        self.param_string = param_string
-        if len(param_string) == 1 and param_string.islower():  # Variable
-            self.is_var = True
-        elif param_string[0].isupper():  # Constant
-            self.is_var = False
-        else:
-            raise ValueError("Malformed parameter")
-
-    def __repr__(self) -> str:
-        return self.param_string
-
-
-class Literal:
-    def __init__(self, literal_string: str) -> None:
-        self.parse_literal_string(literal_string)
-
-    def negate(self):
-        self.negated = not self.negated
-        self.update_lit_string()
-        return self
-
-    def __eq__(self, other):
-        if str(self) == str(other):
-            return True
-        return False
-
-    def __hash__(self):
-        return hash(str(self))
-
-    def copy(self):
-        return copy.deepcopy(self)
-
-    def contains_only_constants(self) -> bool:
-        for p in self.parameters:
-            if p.is_var:
-                return False
-        return True
-
-    def parse_literal_string(self, literal_string: str) -> None:
-        self.literal_string = literal_string
-
-        negation = literal_string[0] == "~"
-        if negation:  # Chop off negation symbol
-            literal_string = literal_string[1:]
-
-        parameters: List[Parameter] = []
-        for index, char in enumerate(literal_string):
-            if char == "(":  # End of predicate name
-                predicate = literal_string[:index]
-                param_start_i = index + 1
-            elif char == ")":  # End of parameter name
-                param = literal_string[param_start_i:index]
-                parameters.append(Parameter(param))
-            elif char == ",":  # New parameter
-                param = literal_string[param_start_i:index]
-                param_start_i = index + 1
-                parameters.append(Parameter(param))
-
-        self.negated = negation
-        self.predicate = predicate
-        self.parameters = parameters
-
-    def update_lit_string(self) -> str:
-        result = ""
-        if self.negated:
-            result += "~"
-        result += self.predicate + "("
-        for i, p in enumerate(self.parameters):
-            result += str(p)
-            if i != len(self.parameters) - 1:
-                result += ","
-        result += ")"
-
-        self.literal_string = result
-
-        return self.literal_string
-
-    def __repr__(self):
-        return self.update_lit_string()
-
-
-class Sentence:
-    def __init__(self, sentence_string: str) -> None:
-        self.disjoint_literals: List[Literal] = []
-        self.contains_constant = False
-        self.parse_sentence_string(sentence_string)
-
-    def clone(self):
-        return Sentence(self.update_sentence_string())
-
-    def parse_sentence_string(self, sentence_string: str) -> None:
-        self.sentence_string = sentence_string
-        disjoint_literals = sentence_string.split("|")
-
-        for lit in disjoint_literals:
-            if lit:
-                self.disjoint_literals.append(Literal(lit.strip()))
-        self.disjoint_literals = sorted(
-            self.disjoint_literals, key=lambda l: l.predicate)
-        self.update_sentence_string()
-
-    def contains_only_constants(self) -> bool:
-        for l in self.disjoint_literals:
-            if not l.contains_only_constants():
-                return False
-        return True
-
-    def __repr__(self):
-        return self.sentence_string
-
-    def __eq__(self, other):
-        if str(self) == str(other):
-            return True
-        return False
-
-    def __hash__(self):
-        return hash(str(self))
-
-    def update_sentence_string(self) -> str:
-        resultant_string = ""
-        self.disjoint_literals.sort(key=lambda l: l.predicate)
-        if self.disjoint_literals:
-            for i, lit in enumerate(self.disjoint_literals):
-                if lit.negated:
-                    resultant_string += "~"
-                resultant_string += lit.predicate + "("
-
-                for j, p in enumerate(lit.parameters):
-                    if not p.is_var:
-                        self.contains_constant = True
-
-                    resultant_string += str(p)
-
-                    if j != len(lit.parameters) - 1:
-                        resultant_string += ","
-
-                resultant_string += ")"
-                if i != len(self.disjoint_literals) - 1:
-                    resultant_string += "|"
-        self.sentence_string = resultant_string
-        return resultant_string
-
-    def to_literal(self) -> Literal:
-        assert len(self.disjoint_literals) == 1
-
-        return self.disjoint_literals[0]
+from budget import Answer, Budget, BudgetExhausted, ProofResult
+from datalog import DatalogProgram
+from graph import ResolutionGraph, wait_renders
+from lemmas import LemmaCache
+from matchlog import LogLevel, MatchLog
+from metrics import QueryMetrics, write_jsonl
+from reader import InputReader, ParseError, read_input
+from sld import FALSE_ATOM, HornProgram, is_horn
+from snapshot import Snapshot, read_snapshot, write_snapshot
+from store import ClauseStore, ClauseQueue
+from terms import SYMBOLS, Parameter, Literal, Sentence, standard_variable
+from unify import canonical_clause, factors, resolvents, standardize_apart
+
+# Complete resolution need not terminate on satisfiable input, so the number
+# of given sentences processed per query is bounded; running out of this or
+# any other budget answers UNKNOWN
+CUTOFF = 1000
+
+# Resolvents of more literals than this are dropped rather than queued, and
+# a search that drops any answers UNKNOWN instead of FALSE. Left unbounded,
+# some knowledge bases derive ever longer sentences, whose factors and
+# subsumption checks grow combinatorially with their length.
+MAX_LITERALS = 8
+
+# Datalog knowledge bases with at least this many ground facts, and this
+# many per rule, are materialized bottom-up rather than searched. With few
+# facts per rule, materializing derives far more than one query needs.
+DATALOG_FACTS = 1000
+DATALOG_FACTS_PER_RULE = 10
 
 
 def printk(kb: List[Sentence]):
@@ -177,406 +49,1030 @@ def printk(kb: List[Sentence]):
 
 
 def parse_input(fname: str) -> Tuple[List[Literal], List[Sentence]]:
-    with open(fname, "r") as f:
-        lines = f.read().split("\n")
-
-        num_queries = int(lines[0])
-        queries = lines[1:num_queries + 1]
-
-        num_sent = int(lines[num_queries + 1])
-        sentences = lines[num_queries + 2:num_queries + num_sent + 2]
-
-    # Instantiate objects for parsing and component representation
-    parsed_queries = []
-    for q in queries:
-        parsed_queries.append(Literal(q))
-
-    parsed_sentences = []
-    for s in sentences:
-        parsed_sentences.append(Sentence(s))
-
-    return parsed_queries, parsed_sentences
-
-
-def unify(sentence: Sentence, unifier_dict: Dict[str, str]) -> Tuple[Sentence, UnifStatus]:
-    sent = sentence.clone()
-    # Typically occurs when sentence is one literal long, but happens whenever
-    # a sentence is fully complimented
-    if not sent.disjoint_literals:
-        return None, UnifStatus.EMPTY
-
-    for literal in sent.disjoint_literals:
-        for i, p in enumerate(literal.parameters):
-            if str(p) in unifier_dict:
-                for _ in literal.parameters:
-                    # Disallow resolving s.t. a predicate contains two
-                    # equivalent constants
-                    if str(_) == unifier_dict[str(p)]:
-                        # Invalid resolution
-                        return None, UnifStatus.INVALID
-
-                literal.parameters[i] = Parameter(unifier_dict[str(p)])
-                literal.update_lit_string()
-                sent.contains_constant = True  # Most likely redundant
-    sent.update_sentence_string()
-    return sent, UnifStatus.SUCCESS
-
-
-def resolve(sent1: Sentence,
-            sent2: Sentence,
-            predicate_matches: List[Tuple[int, int]],
-            unifier: Dict[str, str],
-            perfect_compliment: bool) -> Tuple[Any, UnifStatus]:
-    s1_copy = sent1.clone()
-    s2_copy = sent2.clone()
-    # No need to unify predicates that will cancel out
-    for index_tuple in predicate_matches:
-        s1_copy.disjoint_literals[index_tuple[0]] = None
-        s2_copy.disjoint_literals[index_tuple[1]] = None
-    s1_copy.disjoint_literals = [x for x in s1_copy.disjoint_literals if x]
-    s2_copy.disjoint_literals = [x for x in s2_copy.disjoint_literals if x]
-
-    # Unify remaining literals
-    s1_unified, s1_status = unify(s1_copy, unifier)
-    s2_unified, s2_status = unify(s2_copy, unifier)
-
-    # If the result is empty, double-check that we have a  compliment.
-    # Otherwise, something unknown went wrong.
-    if s1_status == UnifStatus.EMPTY and s2_status == UnifStatus.EMPTY:
-        if not sent1.contains_only_constants() and not sent2.contains_only_constants():
-            if perfect_compliment:
-                return None, UnifStatus.SUCCESS
-            else:
-                return None, UnifStatus.FAIL
-    # Invalid unification
-    elif s1_status == UnifStatus.INVALID or s2_status == UnifStatus.INVALID:
-        return None, UnifStatus.FAIL
-
-    # Update string representations
-    s1_str = s2_str = ""
-
-    if s1_unified:
-        s1_str = s1_unified.update_sentence_string()
-    if s2_unified:
-        s2_str = s2_unified.update_sentence_string()
-
-    s1_empty = not bool(s1_str)
-    s2_empty = not bool(s2_str)
-
-    if s1_empty and s2_empty:
-        return None, UnifStatus.SUCCESS
-    elif s1_empty and not s2_empty:
-        return Sentence(s2_str), UnifStatus.SUCCESS
-    elif not s1_empty and s2_empty:
-        return Sentence(s1_str), UnifStatus.SUCCESS
-    else:
-        return Sentence(s1_str + "|" + s2_str), UnifStatus.SUCCESS
-
-
-def form_unifiers(s1: Sentence, s2: Sentence, matches: List[Tuple[int, int]]):
-    unifiers = []
-    # For each predicate match, form a separate unifier dictionary
-    for m in matches:
-        unif = {}
-        for i, p1 in enumerate(s1.disjoint_literals[m[0]].parameters):
-            p2 = s2.disjoint_literals[m[1]].parameters[i]
-            # Unify variables to anything, but constants remain untouched
-            if p1.is_var:
-                if str(p1) != str(p2):
-                    unif[str(p1)] = str(p2)
-            elif p2.is_var:
-                if str(p1) != str(p2):
-                    unif[str(p2)] = str(p1)
-        unifiers.append(unif)
-
-    return unifiers
-
-
-def unify_and_resolve(sent1: Sentence, sent2: Sentence) -> Tuple[Any, UnifStatus]:
-    general_unifier: Dict[str, str] = {}
-    predicate_matches: List[Tuple[int, int]] = []
-    # Match predicates
-    all_var_flag = True
-    const_mismatch = False
-    cross_match = False
-
-    crosses: DefaultDict[int, List[int]] = defaultdict(list)
-    # Go through each literal and find the ones are complimentary matches
-    for i, lit1 in enumerate(sent1.disjoint_literals):
-        for j, lit2 in enumerate(sent2.disjoint_literals):
-            if lit1.predicate == lit2.predicate and lit1.negated != lit2.negated:
-                # Check for existing match i.e. a "cross match"
-                # When there are cross matches we have to do more work
-                for match in predicate_matches:
-                    if match[0] == i or match[1] == j:
-                        cross_match = True
-                        crosses[match[0]].append(match[1])
-                        crosses[i].append(j)
-                        predicate_matches.remove((match[0], match[1]))
-
-                if not cross_match:
-                    predicate_matches.append((i, j))
-
-                # Set up unification of parameters
-                for k in range(len(lit1.parameters)):
-                    if lit1.parameters[k].is_var and not lit2.parameters[k].is_var:
-                        if str(lit2.parameters[k]) not in general_unifier:
-                            all_var_flag = False
-                            if not cross_match:
-                                general_unifier[str(lit1.parameters[k])] = str(
-                                    lit2.parameters[k])
-                    elif not lit1.parameters[k].is_var and lit2.parameters[k].is_var:
-                        if str(lit2.parameters[k]) not in general_unifier:
-                            all_var_flag = False
-                            if not cross_match:
-                                general_unifier[str(lit2.parameters[k])] = str(
-                                    lit1.parameters[k])
-                    elif lit1.parameters[k].is_var and lit2.parameters[k].is_var:
-                        if str(lit1.parameters[k]) not in general_unifier and str(lit2.parameters[k]) not in general_unifier:
-                            if str(lit1.parameters[k]) != str(lit2.parameters[k]):
-                                if not cross_match:
-                                    general_unifier[str(lit1.parameters[k])] = str(
-                                        lit2.parameters[k])
-                    else:  # Both compared parameters are constants
-                        all_var_flag = False
-                        if str(lit1.parameters[k]) != str(lit2.parameters[k]):
-                            const_mismatch = True
-                            break
-            if const_mismatch:
-                break
-    # A perfect compliment is something like: ~A(x) and A(x)
-    perfect_compliment = len(predicate_matches) == len(
-        sent1.disjoint_literals) == 1
-    imperfect_compliment = (all_var_flag and not perfect_compliment)
-
-    if imperfect_compliment or const_mismatch:  # Failure
-        return None, UnifStatus.FAIL
-
-    # Cross match resolution strategy
-    if cross_match:
-        combos = []
-
-        done: DefaultDict[Tuple[int, int], bool] = defaultdict(bool)
-        # Form all possible combinations of cross matches
-        for _ in range(len(crosses) * len(crosses[0])):
-            available = [True for x in crosses]
-            for l_index in crosses:
-                for i, r_index in enumerate(crosses[l_index]):
-                    if available[i] and not done[(l_index, r_index)]:
-                        available[i] = False
-                        done[(l_index, r_index)] = True
-                        combos.append((l_index, r_index))
-                        break
-
-        # Form unifier dictionaries from combinations
-        new_unifs = form_unifiers(sent1, sent2, combos)
-        results = []
-        # Try each combination
-        for ind, p in enumerate(combos):
-            p_matches = copy.deepcopy(predicate_matches)
-            p_matches.append(p)
-            unif = new_unifs[ind]
-
-            result, status = resolve(
-                sent1, sent2, p_matches, unif, perfect_compliment)
-            # REVIEW If one fails, all fail
-            if status == UnifStatus.FAIL:
-                return None, UnifStatus.FAIL
-            else:
-                results.append(result)
-
-        return (results), UnifStatus.MULTI
-
-    else:
-        # Remove complimentary matched predicates
-        return resolve(sent1, sent2, predicate_matches, general_unifier, perfect_compliment)
+    queries, sentences = read_input(fname)
+    return queries, list(sentences)
 
 
 def verify(s):
-    old = copy.deepcopy(s)
-
-    # Compact sentences that have somehow ended up with repeated predicates
-    s.disjoint_literals = sorted(
-        list(set(old.disjoint_literals)), key=lambda c: c.predicate)
-
-    s.update_sentence_string()
-
-    if len(s.disjoint_literals) > 0:
+    # Canonical form, so that variants of a sentence are stored once; None
+    # for tautologies and the empty sentence
+    s = canonical_clause(s.disjoint_literals)
+    if s:
         return s
     else:
         return None
 
 
-def update_kb(know_base, resultant_sentence):
-    # Update the knowledge base with new sentence
-    resultant_sentence = verify(resultant_sentence)
-
-    if not resultant_sentence:
+def update_kb(know_base: ClauseStore, unprocessed: ClauseQueue,
+              resultant_sentence) -> bool:
+    # Queue a new sentence unless it is already known. Subsumption against
+    # the processed sentences is settled when it is selected as given clause.
+    # Resolvents are in canonical form already; anything else goes through
+    # verify first.
+    if not resultant_sentence or resultant_sentence in know_base:
         return False
-    in_kb_flag = False
-    for s in know_base:
-        if str(s) == str(resultant_sentence):
-            in_kb_flag = True
-    # Avoid adding duplicates
-    if not in_kb_flag:
-        know_base.append(resultant_sentence)
+    return unprocessed.push(resultant_sentence)
+
+
+def factor_partners(know_base: ClauseStore, partners: Set[int],
+                    factored: Set[int], budget: Budget) -> List[int]:
+    """Store the factors of the partners not factored yet, and recursively
+    theirs, as processed sentences, and return their ids. The knowledge base
+    is factored lazily, a sentence when it first meets a given sentence, as
+    the factors of a long sentence can be exponentially many."""
+    found = []
+    fresh = [s_id for s_id in partners if s_id not in factored]
+    while fresh and not budget.out_of_time():
+        s_id = fresh.pop()
+        factored.add(s_id)
+        sentence = know_base.get(s_id)
+        if sentence is None:
+            continue
+        for factor in factors(sentence):
+            f_id = know_base.add(factor)
+            if f_id is not None:
+                found.append(f_id)
+                fresh.append(f_id)
+    return found
+
+
+class KnowledgeBase:
+    """Sentences parsed, reduced and indexed once, then shared by every query.
+
+    Compiling drops empty, duplicate and subsumed sentences. Ground unit
+    sentences are also hashed into facts, which answer ground queries that
+    are a fact or contradict one without a search, and which are resolved
+    away from the other sentences up front. Queries never modify the
+    compiled store; each one runs on a copy-on-write overlay that only holds
+    the negated query and the sentences derived from it. A Horn knowledge
+    base is also compiled into a HornProgram for goal-directed SLD
+    resolution and, if it is range-restricted, into a DatalogProgram for
+    bottom-up materialization.
+
+    An optional LemmaCache remembers settled ground queries across proofs."""
+
+    def __init__(self, sentences: Iterable[Sentence],
+                 lemmas: Optional[LemmaCache] = None) -> None:
+        self.lemmas = lemmas
+        self.store = ClauseStore()
+        self.facts: Set[Literal] = set()
+        for sentence in sentences:
+            sentence = verify(sentence)
+            if sentence and self.store.add(sentence) is not None:
+                self._add_fact(sentence)
+        self._simplify()
+        self._compile_engines()
+
+    @classmethod
+    def from_compiled(cls, sentences: Iterable[Sentence],
+                      lemmas: Optional[LemmaCache] = None
+                      ) -> "KnowledgeBase":
+        """The knowledge base whose store holds sentences, such as those of
+        a snapshot: they are indexed as they are, not reduced again."""
+        kb = cls.__new__(cls)
+        kb.lemmas = lemmas
+        kb.store = ClauseStore()
+        kb.facts = set()
+        for sentence in sentences:
+            kb.store.insert(sentence)
+            kb._add_fact(sentence)
+        kb._compile_engines()
+        return kb
+
+    def _compile_engines(self) -> None:
+        self.horn = HornProgram(self.store) if is_horn(self.store) else None
+        self.datalog = DatalogProgram.compile(self.store) \
+            if self.horn is not None else None
+
+    def _add_fact(self, sentence: Sentence) -> bool:
+        if len(sentence) != 1 or not sentence.contains_only_constants():
+            return False
+        self.facts.add(sentence.to_literal())
         return True
-    return False
-
-
-def prove_by_resolution(k_base: List[Sentence], query: Literal) -> bool:
-    iterations = last = progress_counter = 0
-    # Negate query, convert to sentence, and add it to knowledge base
-    not_query = Sentence(query.copy().negate().update_lit_string())
-    know_base = copy.deepcopy(k_base)
-    know_base = [not_query] + know_base
-
-    tried_pairs: Dict[Tuple[str, str], bool] = {}
-    t_index = 0
-    s_index = 1
 
-    while True:
-        iterations += 1
-        # Maximum number of combinations we can possibly try
-        saturated = len(know_base) * (len(know_base) - 1)
-        if len(tried_pairs) % 2 != 0:  # This shouldn't occur! Pairs are added... well... in pairs
-            raise ValueError("Invalid pair size!")
-        if len(tried_pairs) >= saturated:
-            print("[!] Tried all combinations! Query must be false.")
+    def _simplify(self) -> None:
+        """Unit resolution against the facts: drop every ground literal whose
+        complement is a fact, which may in turn produce new facts. The
+        shortened sentence is a resolvent that subsumes the original one."""
+        pending = self.store.ids()
+        while pending:
+            clause_id = pending.pop()
+            sentence = self.store.get(clause_id)
+            if sentence is None or len(sentence) == 1:
+                continue
+            kept = self._unit_reduce(sentence)
+            # An empty remainder means the KB is inconsistent; leave that to
+            # the search rather than hide it here
+            if len(kept) == len(sentence) or not kept:
+                continue
+            self.store.retire(clause_id)
+            reduced = Sentence.from_literals(kept)
+            if self.store.add(reduced) is not None and \
+                    self._add_fact(reduced):
+                # Revisit the sentences the new fact may shorten
+                pending += self.store.lookup(kept[0].predicate,
+                                             not kept[0].negated)
+
+    def _unit_reduce(self, sentence: Sentence) -> List[Literal]:
+        return [l for l in sentence.disjoint_literals
+                if not l.contains_only_constants()
+                or l.negate() not in self.facts]
+
+    def tell(self, sentence: Sentence) -> bool:
+        """Add a sentence to the compiled knowledge base in place. It is
+        reduced against the facts and indexed like the input sentences, and
+        the Horn engines are extended rather than rebuilt; the sentences
+        already stored are not revisited. Returns False if the store already
+        held it or a sentence subsuming it."""
+        sentence = verify(sentence)
+        if not sentence:
             return False
+        kept = self._unit_reduce(sentence)
+        if kept and len(kept) < len(sentence):
+            sentence = Sentence.from_literals(kept)
+        if self.store.add(sentence) is None:
+            return False
+        self._add_fact(sentence)
+        if self.horn is not None and is_horn([sentence]):
+            self.horn.extend(sentence.disjoint_literals)
+            if self.datalog is not None and not self.datalog.add(sentence):
+                self.datalog = None
+        else:
+            self.horn = self.datalog = None
+        if self.lemmas is not None:
+            self.lemmas.forget_unproven()
+        return True
 
-        try_resolve = True
-        resolved_flag = False
-
-        target_sentence = know_base[t_index]
-        current_sentence = know_base[s_index]
+    def lookup_fact(self, query: Literal) -> Optional[bool]:
+        """True if a ground query is a fact, False if it contradicts one,
+        None when the facts alone do not settle it."""
+        if not query.contains_only_constants():
+            return None
+        if query in self.facts:
+            return True
+        if query.negate() in self.facts:
+            # Provided the KB is consistent, it cannot also entail the query
+            return False
+        return None
 
-        # Check if we've alraedy tried this pair
-        if s_index != t_index:
-            try:
-                # REVIEW Realistically we only need to check one of these since
-                # they should both have the same values
-                if tried_pairs[(str(current_sentence), str(target_sentence))] or tried_pairs[(str(target_sentence), str(current_sentence))]:
-                    resolved_flag = True
-            except KeyError:  # Sloppy, but happens when a key is not in dict
-                tried_pairs[(str(current_sentence),
-                             str(target_sentence))] = True
-                tried_pairs[(str(target_sentence),
-                             str(current_sentence))] = True
-
-        if resolved_flag or s_index == t_index:
-            try_resolve = False
-
-        if try_resolve:
-            # Look for complimentary matching predicates
-            for cur_lit in current_sentence.disjoint_literals:
-                breakout = False
-                for tar_lit in target_sentence.disjoint_literals:
-                    if cur_lit.predicate == tar_lit.predicate and cur_lit.negated != tar_lit.negated:
-
-                        result, status = unify_and_resolve(
-                            current_sentence, target_sentence)
-                        if status == UnifStatus.SUCCESS:
-                            t_str = "[TARGET] " + str(target_sentence)
-                            m_str = "[MATCH] " + str(current_sentence)
-                            r_str = "[RESULT] " + str(result)
-                            match_str = t_str + "\n" + m_str + "\n" + r_str + "\n\n"
-
-                            # Used in case we want to write results to file
-                            MATCHES.append(match_str)
-
-                            if not result:  # Great success!
-                                print(
-                                    "[!] Contradiction found! Query is consistent with knowledge base.")
-                                return True
-
-                            ResGraph.add(current_sentence,
-                                         target_sentence, result)
-                            updated = update_kb(know_base, result)
-
-                            if updated:
-                                progress_counter += 1
-                                diff = iterations - last
-                                last = iterations
-
-                                if diff >= CUTOFF:
-                                    print("[!] Infinite loop detected.")
-                                    return False
-
-                            t_index = 0
-                            s_index = 0
-
-                            breakout = True
-                            know_base = sorted(
-                                know_base, key=lambda s:
-                                len(s.disjoint_literals))
-                            break
-                        elif status == UnifStatus.MULTI:
-                            # Multiple sentences returned
-                            for r in result:
-                                update_kb(know_base, r)
-                                ResGraph.add(current_sentence,
-                                             target_sentence, r)
-                                t_index = 0
-                                s_index = 0
-
-                                breakout = True
-                                know_base = sorted(
-                                    know_base, key=lambda s:
-                                    len(s.disjoint_literals))
-
-                if breakout:
-                    break
-            if breakout:
+    @classmethod
+    def from_file(cls, fname: str, use_mmap: bool = False,
+                  lemmas: Optional[LemmaCache] = None
+                  ) -> Tuple[List[Literal], "KnowledgeBase", int]:
+        """Compile an input file while streaming it, without ever holding
+        all of its lines or parsed sentences in memory. Also returns the
+        number of sentences the file holds."""
+        with InputReader(fname, use_mmap) as reader:
+            queries = reader.queries()
+            kb = cls(reader.sentences(), lemmas)
+        return queries, kb, reader.count
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __iter__(self):
+        return iter(self.store)
+
+    def __reduce__(self):
+        # The store holds raw symbol ids, so the symbol table goes first
+        return _knowledge_base, (SYMBOLS, self.store, self.facts,
+                                 self.horn, self.datalog, self.lemmas)
+
+    def overlay(self) -> ClauseStore:
+        return ClauseStore(base=self.store)
+
+    def prove(self, query: Literal, **options) -> ProofResult:
+        return prove_by_resolution(self, query, **options)
+
+
+def _knowledge_base(symbols, store: ClauseStore, facts: Set[Literal],
+                    horn: Optional[HornProgram],
+                    datalog: Optional[DatalogProgram],
+                    lemmas: Optional[LemmaCache]) -> KnowledgeBase:
+    kb = KnowledgeBase.__new__(KnowledgeBase)
+    kb.store = store
+    kb.facts = facts
+    kb.horn = horn
+    kb.datalog = datalog
+    kb.lemmas = lemmas
+    return kb
+
+
+def prove_by_resolution(k_base: Union[KnowledgeBase, List[Sentence]],
+                        query: Literal,
+                        pick_ratio: int = 4,
+                        cutoff: Optional[int] = CUTOFF,
+                        time_limit: Optional[float] = None,
+                        clause_limit: Optional[int] = None,
+                        memory_limit: Optional[int] = None,
+                        max_literals: Optional[int] = MAX_LITERALS,
+                        engine: str = "auto",
+                        matches: Optional[MatchLog] = None,
+                        graph: Optional[ResolutionGraph] = None,
+                        metrics: Optional[QueryMetrics] = None
+                        ) -> ProofResult:
+    """Refute the negated query against k_base. The answer is UNKNOWN when
+    cutoff given sentences, time_limit seconds, clause_limit generated
+    sentences or memory_limit bytes of resident memory are used up first,
+    or when resolvents of more than max_literals literals had to be dropped.
+
+    With engine "auto", a Horn knowledge base is handed to SLD resolution,
+    or materialized if it is a Datalog program with enough facts (see
+    DATALOG_FACTS); "sld" and "datalog" pick one of those whenever it applies and
+    "general" always runs the given-clause loop below. The Horn engines
+    record no steps and ignore the cutoff and clause limit. Resolution
+    steps are recorded on the matches log and graph, and counters and
+    timings on metrics, when those are given."""
+    if not isinstance(k_base, KnowledgeBase):
+        k_base = KnowledgeBase(k_base)
+    lemmas = k_base.lemmas
+    result = _prove_directly(k_base, query, engine, time_limit, clause_limit,
+                             memory_limit, metrics)
+    if result is not None:
+        return result
+    budget = Budget(cutoff, time_limit, clause_limit, memory_limit)
+    iterations = 0
+    generated = 0
+    dropped = 0
+    cut_short = False
+    # Negate query, convert to sentence, and add it to knowledge base
+    not_query = verify(Sentence.from_literals([query.negate()]))
+
+    # Given-clause loop: every sentence is resolved only against those
+    # processed before it, so each pair is tried exactly once, and its
+    # factors are queued. The compiled sentences start out processed, so
+    # only the negated query and its descendants are ever selected (the set
+    # of support strategy; with factoring, complete as long as the knowledge
+    # base itself is consistent); their factors are stored once they first
+    # meet a given sentence (see factor_partners).
+    know_base = k_base.overlay()
+    know_base.deadline = budget.deadline
+    if lemmas is not None:
+        # Earlier proven queries are consequences of the KB: extra premises
+        for unit in lemmas.units():
+            know_base.add(unit)
+    unprocessed = ClauseQueue(pick_ratio)
+    log_every = matches is not None and matches.every_step
+    factored: Set[int] = set()
+    if graph is not None:
+        graph.set_root(not_query)
+    update_kb(know_base, unprocessed, not_query)
+
+    while unprocessed:
+        # Checked before every pop, as runs of subsumed givens take time too
+        reason = budget.exhausted(iterations, generated)
+        if reason is not None:
+            print("[!] Gave up: %s. Query is unknown." % reason)
+            return ProofResult(Answer.UNKNOWN, reason)
+        given_sentence = unprocessed.pop()
+        # Duplicates and subsumed sentences are dropped by the store, which
+        # also retires any processed sentences the given one subsumes
+        given_id = know_base.add(given_sentence)
+        if given_id is None:
+            if metrics is not None:
+                metrics.subsumed += 1
+            continue
+        iterations += 1
+        if metrics is not None:
+            metrics.iterations = iterations
+            metrics.peak_kb = max(metrics.peak_kb, len(know_base))
+
+        factored.add(given_id)
+        for factor in factors(given_sentence):
+            generated += 1
+            if log_every:
+                matches.record(given_sentence, given_sentence, factor)
+            if graph is not None:
+                graph.add(given_sentence, given_sentence, factor)
+            update_kb(know_base, unprocessed, factor)
+
+        # Only sentences holding a complementary literal can resolve. The
+        # given sentence may resolve with itself, hence standardizing apart.
+        given_apart = standardize_apart(given_sentence)
+        partners = know_base.complementary(given_sentence)
+        found = factor_partners(know_base, partners, factored, budget)
+        generated += len(found)
+        partners.update(found)
+        for s_id in sorted(partners):
+            current_sentence = know_base.get(s_id)
+            if current_sentence is None:
                 continue
 
-        s_index += 1
+            if metrics is not None:
+                metrics.pairs_tried += 1
+            for result in resolvents(current_sentence, given_apart, metrics):
+                generated += 1
+                if log_every:
+                    matches.record(given_sentence, current_sentence, result)
+
+                if not result:  # Great success!
+                    if matches is not None and not log_every:
+                        matches.record(given_sentence, current_sentence,
+                                       result)
+                    if graph is not None:
+                        graph.add(current_sentence, given_sentence, result)
+                    print(
+                        "[!] Contradiction found! Query is consistent with knowledge base.")
+                    if lemmas is not None:
+                        lemmas.put(query, True)
+                    return ProofResult(Answer.TRUE)
+                if max_literals is not None and len(result) > max_literals:
+                    dropped += 1
+                    continue
+
+                if graph is not None:
+                    start = time.perf_counter()
+                    graph.add(current_sentence, given_sentence, result)
+                    if metrics is not None:
+                        metrics.add_time("graph", start)
+                if metrics is None:
+                    update_kb(know_base, unprocessed, result)
+                else:
+                    start = time.perf_counter()
+                    if not update_kb(know_base, unprocessed, result):
+                        metrics.duplicates += 1
+                    metrics.add_time("update_kb", start)
+            # A given sentence with many partners can take long on its own
+            if budget.out_of_time():
+                cut_short = True
+                break
+        if cut_short:
+            break
+
+    if cut_short:
+        reason = budget.exhausted(iterations, generated)
+        print("[!] Gave up: %s. Query is unknown." % reason)
+        return ProofResult(Answer.UNKNOWN, reason)
+    if dropped:
+        reason = "%d sentences over %d literals dropped" % (dropped,
+                                                            max_literals)
+        print("[!] Gave up: %s. Query is unknown." % reason)
+        return ProofResult(Answer.UNKNOWN, reason)
+    print("[!] Tried all combinations! Query must be false.")
+    if lemmas is not None:
+        lemmas.put(query, False)
+    return ProofResult(Answer.FALSE)
+
+
+def _batch_goal(group: int, queries: Sequence[Literal]
+                ) -> Tuple[Sentence, List[Tuple[Parameter, ...]]]:
+    """Negated goal searched for queries that differ at most in constants:
+    the complement of their least general generalization with an answer
+    literal over its variables, and the binding of those variables that
+    gives back each query. The "$" keeps the answer predicate apart from
+    any predicate of the input."""
+    variables: Dict[Tuple[Parameter, ...], Parameter] = {}
+    params = []
+    for column in zip(*[q.parameters for q in queries]):
+        if len(set(column)) == 1:
+            params.append(column[0])
+            continue
+        var = variables.get(column)
+        if var is None:
+            var = variables[column] = standard_variable(len(variables))
+        params.append(var)
+    first = queries[0]
+    general = Literal.make(not first.negated, first.predicate, tuple(params))
+    answer = Literal.make(False, SYMBOLS.intern("$answer%d" % group),
+                          tuple(variables.values()))
+    keys = [tuple([column[k] for column in variables])
+            for k in range(len(queries))]
+    return Sentence.from_literals([general, answer]), keys
+
+
+def _bound_key(answers: Iterable[Literal]
+               ) -> Optional[Tuple[Parameter, ...]]:
+    """The only key answers can cover, if they are all bound to the same
+    constants."""
+    arguments = {a.parameters for a in answers}
+    if len(arguments) == 1:
+        arguments = arguments.pop()
+        if all(not p.is_var for p in arguments):
+            return arguments
+    return None
+
+
+def _covered(answers: List[Literal], keys: Iterable[Tuple[Parameter, ...]]
+             ) -> List[Tuple[Parameter, ...]]:
+    """Keys a disjunction of answers covers: one substitution must turn
+    every answer into the key, so the disjunction is just that answer."""
+    bound = _bound_key(answers)
+    if bound is not None:
+        return [bound] if bound in keys else []
+    covered = []
+    for key in keys:
+        binding: Dict[Parameter, Parameter] = {}
+        if all(binding.setdefault(p, t) is t if p.is_var else p is t
+               for a in answers for p, t in zip(a.parameters, key)):
+            covered.append(key)
+    return covered
+
+
+def prove_batch(k_base: Union[KnowledgeBase, List[Sentence]],
+                queries: Sequence[Literal],
+                pick_ratio: int = 4,
+                cutoff: Optional[int] = CUTOFF,
+                time_limit: Optional[float] = None,
+                clause_limit: Optional[int] = None,
+                memory_limit: Optional[int] = None,
+                max_literals: Optional[int] = MAX_LITERALS,
+                engine: str = "auto") -> List[ProofResult]:
+    """Answer many queries with one given-clause loop instead of one each.
+
+    Queries the lemma cache, the facts or a Horn engine settle are answered
+    as by prove_by_resolution. Ground queries over the same predicate and
+    polarity then share one negated goal, the complement of their least
+    general generalization, tagged with an answer literal that nothing
+    resolves with and that records what each derivation has bound the
+    goal's variables to. A derived sentence of answers alone proves the
+    queries it covers (see _covered), and a goal none of whose descendants
+    remain queued leaves its open queries FALSE. Descendants of different
+    goals are never resolved together, and those covering no open query are
+    dropped. Every other query gets a goal of its own, which makes its
+    search the one prove_by_resolution runs. A proven ground query becomes
+    a premise for the rest.
+
+    The cutoff is per query searched; the other budgets cover the batch."""
+    if not isinstance(k_base, KnowledgeBase):
+        k_base = KnowledgeBase(k_base)
+    lemmas = k_base.lemmas
+    results: List[Optional[ProofResult]] = []
+    grouped: Dict[Any, List[int]] = {}
+    for i, query in enumerate(queries):
+        print("=>", query)
+        result = _prove_directly(k_base, query, engine, time_limit,
+                                 clause_limit, memory_limit)
+        results.append(result)
+        if result is None:
+            group = (query.predicate, query.negated, len(query.parameters)) \
+                if query.contains_only_constants() else i
+            grouped.setdefault(group, []).append(i)
+    if not grouped:
+        return results
+
+    know_base = k_base.overlay()
+    if lemmas is not None:
+        for unit in lemmas.units():
+            know_base.add(unit)
+    unprocessed = ClauseQueue(pick_ratio)
+    # Per goal: the positions of its open queries by key, and its queued
+    # descendants. Answer predicates map to goals, and processed sentences
+    # to their goal and the key they are bound to, if any. Goals with
+    # resolvents dropped for their length are never saturated.
+    open_keys: List[Dict[Tuple[Parameter, ...], List[int]]] = []
+    queued: List[int] = []
+    dropped: Set[int] = set()
+    tags: Dict[int, int] = {}
+    owners: Dict[int, Tuple[int, Optional[Tuple[Parameter, ...]]]] = {}
+    factored: Set[int] = set()
+    for g, members in enumerate(grouped.values()):
+        goal, keys = _batch_goal(g, [queries[i] for i in members])
+        open_keys.append({})
+        for i, key in zip(members, keys):
+            open_keys[g].setdefault(key, []).append(i)
+        tags[SYMBOLS.intern("$answer%d" % g)] = g
+        queued.append(int(update_kb(know_base, unprocessed,
+                                    verify(goal))))
+    searched = sum([len(members) for members in grouped.values()])
+    print("[!] Searching for %d queries with %d goals." %
+          (searched, len(grouped)))
+
+    remaining = searched
+
+    def settle(g: int, key: Tuple[Parameter, ...],
+               result: ProofResult) -> None:
+        nonlocal remaining
+        for i in open_keys[g].pop(key):
+            remaining -= 1
+            results[i] = result
+            print("[!] %s: %s" % (queries[i], result.answer))
+            if lemmas is not None and result.answer is not Answer.UNKNOWN:
+                lemmas.put(queries[i], bool(result))
+            if result and queries[i].contains_only_constants():
+                # Proven, so a consequence of the KB
+                know_base.add(Sentence.from_literals([queries[i]]))
+
+    def saturated(g: int) -> ProofResult:
+        if g not in dropped:
+            return ProofResult(Answer.FALSE)
+        return ProofResult(Answer.UNKNOWN, "sentences over %d literals "
+                                           "dropped" % max_literals)
+
+    budget = Budget(cutoff * searched if cutoff is not None else None,
+                    time_limit, clause_limit, memory_limit)
+    know_base.deadline = budget.deadline
+    iterations = 0
+    generated = 0
+    while unprocessed and remaining:
+        given_sentence = unprocessed.pop()
+        owner = next(tags[l.predicate]
+                     for l in given_sentence.disjoint_literals
+                     if l.predicate in tags)
+        queued[owner] -= 1
+        given_id = know_base.add(given_sentence) \
+            if open_keys[owner] else None
+        cut_short = False
+        if given_id is not None:
+            iterations += 1
+            bound = _bound_key([l for l in given_sentence.disjoint_literals
+                                if l.predicate in tags])
+            owners[given_id] = (owner, bound)
+            factored.add(given_id)
+            for factor in factors(given_sentence):
+                generated += 1
+                answers = [l for l in factor.disjoint_literals
+                           if l.predicate in tags]
+                if _covered(answers, open_keys[owner]) and \
+                        update_kb(know_base, unprocessed, factor):
+                    queued[owner] += 1
+            given_apart = standardize_apart(given_sentence)
+            partners = know_base.complementary(given_sentence)
+            found = factor_partners(know_base, partners, factored, budget)
+            generated += len(found)
+            partners.update(found)
+            for s_id in sorted(partners):
+                current_sentence = know_base.get(s_id)
+                if current_sentence is None:
+                    continue
+                # Resolvents with descendants of another goal, or bound to
+                # another query, answer nothing
+                other = owners.get(s_id)
+                if other is not None and (other[0] != owner or
+                                          bound is not None and
+                                          other[1] is not None and
+                                          other[1] != bound):
+                    continue
+                for result in resolvents(current_sentence, given_apart):
+                    generated += 1
+                    answers = [l for l in result.disjoint_literals
+                               if l.predicate in tags]
+                    covered = _covered(answers, open_keys[owner])
+                    if len(answers) == len(result):
+                        for key in covered:
+                            settle(owner, key, ProofResult(Answer.TRUE))
+                    elif covered and max_literals is not None and \
+                            len(result) - len(answers) > max_literals:
+                        dropped.add(owner)
+                    elif covered and \
+                            update_kb(know_base, unprocessed, result):
+                        queued[owner] += 1
+                if not open_keys[owner]:
+                    break
+                if budget.out_of_time():
+                    cut_short = True
+                    break
 
-        if s_index >= len(know_base):
-            s_index = 0
-            t_index += 1
+        # A goal whose descendants have all been given is saturated, unless
+        # the deadline cut the given sentence short (the budget check below
+        # then gives up)
+        if not queued[owner] and not cut_short:
+            for key in list(open_keys[owner]):
+                settle(owner, key, saturated(owner))
+
+        reason = budget.exhausted(iterations, generated)
+        if reason is not None:
+            print("[!] Gave up: %s." % reason)
+            for g, keys in enumerate(open_keys):
+                for key in list(keys):
+                    settle(g, key, ProofResult(Answer.UNKNOWN, reason))
+            return results
+
+    for g, keys in enumerate(open_keys):
+        for key in list(keys):
+            settle(g, key, saturated(g))
+    return results
+
+
+def _prove_directly(k_base: KnowledgeBase, query: Literal, engine: str,
+                    time_limit: Optional[float], clause_limit: Optional[int],
+                    memory_limit: Optional[int],
+                    metrics: Optional[QueryMetrics] = None
+                    ) -> Optional[ProofResult]:
+    """Answer query from the lemma cache or the facts, or by a Horn engine
+    if engine allows it; None when it needs the given-clause loop."""
+    lemmas = k_base.lemmas
+    if lemmas is not None:
+        cached = lemmas.get(query)
+        if cached is not None:
+            print("[!] Answered from lemma cache.")
+            return ProofResult.settled(cached, "lemmas")
+    known = k_base.lookup_fact(query)
+    if known is not None:
+        if known:
+            print("[!] Query is a known fact.")
+        else:
+            print("[!] Query contradicts a known fact. Query must be false.")
+        return ProofResult.settled(known, "facts")
+    if k_base.datalog is not None and \
+            (engine == "datalog" or engine == "auto" and
+             k_base.datalog.fact_heavy(DATALOG_FACTS,
+                                       DATALOG_FACTS_PER_RULE)) and \
+            (not query.negated or query.contains_only_constants()):
+        result = prove_by_datalog(k_base.datalog, query,
+                                  Budget(None, time_limit, clause_limit,
+                                         memory_limit))
+        if metrics is not None:
+            metrics.engine = result.engine
+        if lemmas is not None and result.answer is not Answer.UNKNOWN:
+            lemmas.put(query, bool(result))
+        return result
+    if engine in ("auto", "sld", "datalog") and k_base.horn is not None:
+        try:
+            result = prove_by_sld(k_base.horn, query,
+                                  Budget(None, time_limit, None, memory_limit))
+        except RecursionError:
+            print("[!] Goals nest too deeply for SLD resolution.")
+        else:
+            if metrics is not None:
+                metrics.engine = result.engine
+            if lemmas is not None and result.answer is not Answer.UNKNOWN:
+                lemmas.put(query, bool(result))
+            return result
+    return None
+
+
+def prove_by_sld(program: HornProgram, query: Literal,
+                 budget: Optional[Budget] = None) -> ProofResult:
+    """Answer query on a Horn program. An atom must be derivable; a negated
+    atom holds if adding the atom as a fact lets some integrity constraint
+    be violated."""
+    try:
+        if query.negated:
+            proven = program.with_fact(query.negate()).prove(FALSE_ATOM,
+                                                             budget)
+        else:
+            proven = program.prove(query, budget)
+    except BudgetExhausted as e:
+        print("[!] Gave up: %s. Query is unknown." % e.reason)
+        return ProofResult(Answer.UNKNOWN, e.reason, "sld")
+    if proven:
+        print("[!] Proven by SLD resolution. Query is consistent with "
+              "knowledge base.")
+    else:
+        print("[!] SLD resolution failed finitely! Query must be false.")
+    return ProofResult.settled(proven, "sld")
 
-        if t_index >= len(know_base):
-            t_index = 0
 
-    return False
+def prove_by_datalog(program: DatalogProgram, query: Literal,
+                     budget: Optional[Budget] = None) -> ProofResult:
+    """Answer query from the materialized relations: an atom must be among
+    them, a negated ground atom holds if adding it violates a constraint."""
+    try:
+        if query.negated:
+            proven = program.violated_with(query.negate(), budget)
+        else:
+            proven = program.holds(query, budget)
+    except BudgetExhausted as e:
+        print("[!] Gave up: %s. Query is unknown." % e.reason)
+        return ProofResult(Answer.UNKNOWN, e.reason, "datalog")
+    print("[!] Looked up among %d materialized facts. Query is %s." %
+          (program.size, "true" if proven else "false"))
+    return ProofResult.settled(proven, "datalog")
+
+
+def fresh_snapshot(fname: str, path: str) -> Optional[Snapshot]:
+    """The snapshot at path, unless it is missing, older than the input file
+    fname or unreadable."""
+    if not os.path.exists(path) or \
+            os.path.getmtime(path) < os.path.getmtime(fname):
+        return None
+    try:
+        return read_snapshot(path)
+    except ValueError as e:
+        print("[!] Ignoring snapshot:", e)
+        return None
 
 
-def write_matches(ind=1):
-    path = "match_logs/matches_input%dquery%d.txt" % (FILE_INDEX, ind)
-    print("[!] Saving match output to:", path)
-    with open(path, "w") as f:
-        for k in k_base:
-            f.write(str(k) + "\n")
-        f.write(str(len(MATCHES)) + "\n")
-        for m in MATCHES:
-            f.write(m)
+# (queries, compiled KB) per input file. Set once per worker process by the
+# pool initializer, or directly when running serially.
+_INPUTS: Dict[int, Tuple[List[Literal], KnowledgeBase]] = {}
+
+
+def _init_worker(symbols, inputs) -> None:
+    # symbols is only passed so that it is unpickled before the KBs
+    _INPUTS.update(inputs)
+
+
+def _profile_path(file_index: int, part: Any) -> str:
+    return "profiles/input%d_%s.prof" % (file_index, part)
+
+
+def run_query(file_index: int, ind: int, collect_metrics: bool = False,
+              profile: bool = False, graph_mode: str = "all",
+              graph_format: str = "png",
+              match_level: LogLevel = LogLevel.ALL, match_last: int = 0,
+              match_gzip: bool = False,
+              **options) -> Tuple[str, str, Optional[Dict[str, Any]],
+                                  Optional[Dict[str, int]]]:
+    """Prove query ind of an input file, write its match log and graph, and
+    return the answer, everything printed while doing so, if asked for the
+    query's metrics and, with a lemma cache, its use (see _lemma_use). graph_mode is "all", "proof" or "off"; graphs are
+    rendered in the background. The match log is streamed to disk as the
+    search runs, see MatchLog for the match_* options. With profile, the job
+    runs under cProfile and its stats are dumped for main to merge per input
+    file."""
+    queries, kb = _INPUTS[file_index]
+    query = queries[ind - 1]
+    lemmas_before = kb.lemmas.stats() if kb.lemmas is not None else None
+    metrics = QueryMetrics(file_index, str(query)) if collect_metrics \
+        else None
+    profiler = cProfile.Profile() if profile else None
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        if profiler is not None:
+            profiler.enable()
+        print("=>", query)
+        matches = MatchLog("match_logs/matches_input%dquery%d.txt" %
+                           (file_index, ind), match_level, match_last,
+                           match_gzip) \
+            if match_level != LogLevel.OFF else None
+        graph = ResolutionGraph(file_index, ind, graph_mode == "proof",
+                                graph_format) \
+            if graph_mode != "off" else None
+        start = time.perf_counter()
+        try:
+            outcome = kb.prove(query, matches=matches, graph=graph,
+                               metrics=metrics, **options)
+            result = outcome.answer.value
+        finally:
+            if matches is not None:
+                matches.close()
+        wall = time.perf_counter() - start
+        if outcome.engine != "resolution":
+            # No resolution steps to log or draw
+            print("[!] Answered by %s: no match log or graph written." %
+                  outcome.engine)
+            if matches is not None:
+                matches.discard()
+            graph = None
+        elif matches is not None:
+            print("[!] Saving match output to:", matches.path)
+        start = time.perf_counter()
+        if graph is not None:
+            graph.save()
+        if metrics is not None:
+            metrics.add_time("graph", start)
+            metrics.wall = wall
+            metrics.answer = result
+            metrics.reason = outcome.reason
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(_profile_path(file_index, "query%d" % ind))
+    lemma_use = _lemma_use(kb.lemmas, lemmas_before)
+    record = metrics.to_dict() if metrics is not None else None
+    if record is not None and lemma_use is not None:
+        record["lemmas"] = lemma_use
+    return result, out.getvalue(), record, lemma_use
+
+
+def run_batch(file_index: int, **options
+              ) -> Tuple[List[str], str, None, Optional[Dict[str, int]]]:
+    """Answer all queries of an input file with prove_batch, like run_query
+    does for one. Nothing is logged, drawn or measured per query."""
+    queries, kb = _INPUTS[file_index]
+    lemmas_before = kb.lemmas.stats() if kb.lemmas is not None else None
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        outcomes = prove_batch(kb, queries, **options)
+    return [outcome.answer.value for outcome in outcomes], out.getvalue(), \
+        None, _lemma_use(kb.lemmas, lemmas_before)
+
+
+def _lemma_use(lemmas: Optional[LemmaCache],
+               before: Optional[Dict[str, int]]) -> Optional[Dict[str, int]]:
+    """The hits, misses and evictions of the lemma cache since its stats
+    were before, and its size now. Jobs on a process pool each use their
+    worker's copy of the cache, so main adds these up per input file."""
+    if lemmas is None:
+        return None
+    now = lemmas.stats()
+    return {key: now[key] - before[key] if key != "size" else now[key]
+            for key in now}
+
+
+def merge_profiles(file_index: int, nqueries: int) -> None:
+    """Merge the parse and per-query profiles of an input file into one."""
+    parts = [_profile_path(file_index, "parse")]
+    parts += [_profile_path(file_index, "query%d" % ind)
+              for ind in range(1, nqueries + 1)]
+    path = "profiles/input%d.prof" % file_index
+    print("[!] Saving profile to:", path)
+    stats = pstats.Stats(parts[0])
+    for part in parts[1:]:
+        stats.add(part)
+    stats.dump_stats(path)
+    for part in parts:
+        os.remove(part)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Answer the queries of cases/inputN.txt by resolution "
+                    "and write the answers to output/outputN.txt.")
+    parser.add_argument("inputs", nargs="*", type=int,
+                        default=list(range(1, 12)),
+                        help="input file numbers N (default: 1 to 11)")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="worker processes to spread the (file, query) "
+                             "jobs over (default: 1, run in-process)")
+    parser.add_argument("--mmap", action="store_true",
+                        help="read input files through a memory map")
+    parser.add_argument("--cutoff", type=int, default=CUTOFF,
+                        help="given sentences per query before answering "
+                             "UNKNOWN "
+                             "(default: %(default)s)")
+    parser.add_argument("--time-limit", type=float, metavar="SECONDS",
+                        help="wall time per query before answering UNKNOWN "
+                             "(default: none)")
+    parser.add_argument("--max-clauses", type=int, metavar="N",
+                        help="sentences generated per query before "
+                             "answering UNKNOWN (default: none)")
+    parser.add_argument("--max-memory", type=int, metavar="MB",
+                        help="resident memory before answering UNKNOWN "
+                             "(default: none)")
+    parser.add_argument("--max-literals", type=int, default=MAX_LITERALS,
+                        metavar="N",
+                        help="drop longer resolvents, answering UNKNOWN "
+                             "rather than FALSE (default: %(default)s)")
+    parser.add_argument("--engine",
+                        choices=["auto", "sld", "datalog", "general"],
+                        default="auto",
+                        help="auto answers queries on Horn knowledge bases "
+                             "by tabled SLD resolution, or by materializing "
+                             "large Datalog ones; sld and datalog prefer "
+                             "one of those; general always uses the "
+                             "given-clause loop (default: %(default)s)")
+    parser.add_argument("--batch", action="store_true",
+                        help="answer the queries of each input file in one "
+                             "shared search; the cutoff then applies per "
+                             "query searched and no match logs, graphs, "
+                             "query metrics or profiles are written")
+    parser.add_argument("--snapshots", action="store_true",
+                        help="load each compiled input from "
+                             "snapshots/inputN.kb when it is newer than "
+                             "the input file, and write it otherwise")
+    parser.add_argument("--pick-ratio", type=int, default=4,
+                        help="lightest-first picks per oldest-first pick of "
+                             "the given sentence (default: %(default)s)")
+    parser.add_argument("--lemmas", type=int, default=0, metavar="SIZE",
+                        help="cache up to SIZE settled ground queries per "
+                             "input file and reuse proven ones as premises; "
+                             "its hits and misses are printed per file and "
+                             "written to --metrics (default: off)")
+    parser.add_argument("--graph", choices=["all", "proof", "off"],
+                        default="all",
+                        help="draw every resolution step, only the proof "
+                             "of the empty clause, or no graph at all "
+                             "(default: %(default)s)")
+    parser.add_argument("--graph-format", choices=["png", "dot"],
+                        default="png",
+                        help="render graphs to PNG or only write their DOT "
+                             "source (default: %(default)s)")
+    parser.add_argument("--match-log", choices=["off", "contradiction", "all"],
+                        default="all",
+                        help="resolution steps to write to match_logs/ "
+                             "(default: %(default)s)")
+    parser.add_argument("--match-log-last", type=int, default=0, metavar="N",
+                        help="keep only the last N steps of each match log "
+                             "(default: keep all)")
+    parser.add_argument("--match-log-gzip", action="store_true",
+                        help="gzip the match logs")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="write per-file and per-query engine metrics "
+                             "to PATH as JSON lines")
+    parser.add_argument("--profile", action="store_true",
+                        help="run under cProfile and write the stats of "
+                             "each input file to profiles/inputN.prof")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    if args.batch:
+        # Profiles are merged from per query parts
+        args.profile = False
+    prove_options = {"cutoff": args.cutoff, "pick_ratio": args.pick_ratio,
+                     "time_limit": args.time_limit, "engine": args.engine,
+                     "clause_limit": args.max_clauses,
+                     "max_literals": args.max_literals,
+                     "memory_limit": args.max_memory << 20
+                     if args.max_memory is not None else None}
+    options = {**prove_options,
+               "collect_metrics": args.metrics is not None,
+               "profile": args.profile, "graph_mode": args.graph,
+               "graph_format": args.graph_format,
+               "match_level": LogLevel[args.match_log.upper()],
+               "match_last": args.match_log_last,
+               "match_gzip": args.match_log_gzip}
+    run = run_batch if args.batch else run_query
+    if args.batch:
+        options = prove_options
+    if args.profile:
+        os.makedirs("profiles", exist_ok=True)
+    if args.snapshots:
+        os.makedirs("snapshots", exist_ok=True)
+
+    inputs = {}
+    nsentences = {}
+    records: List[Dict[str, Any]] = []
+    file_records: Dict[int, Dict[str, Any]] = {}
+    for file_index in args.inputs:
+        profiler = cProfile.Profile() if args.profile else None
+        if profiler is not None:
+            profiler.enable()
+        fname = "cases/input%d.txt" % file_index
+        snapshot_path = "snapshots/input%d.kb" % file_index
+        start = time.perf_counter()
+        snapshot = fresh_snapshot(fname, snapshot_path) \
+            if args.snapshots else None
+        # Compiled once, shared by every query of this file
+        lemmas = LemmaCache(args.lemmas, remember_units=True) \
+            if args.lemmas else None
+        if snapshot is not None:
+            queries, k_base, nsentences[file_index] = snapshot
+            parsed = time.perf_counter()
+            kb = KnowledgeBase.from_compiled(k_base, lemmas)
+        else:
+            # Parsed while compiling, so both count as compiling
+            parsed = start
+            try:
+                queries, kb, nsentences[file_index] = \
+                    KnowledgeBase.from_file(fname, args.mmap, lemmas)
+            except ParseError as e:
+                sys.exit(str(e))
+            if args.snapshots:
+                write_snapshot(snapshot_path, queries, kb.store,
+                               nsentences[file_index])
+        inputs[file_index] = (queries, kb)
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(_profile_path(file_index, "parse"))
+        file_records[file_index] = {"kind": "file",
+                                    "file_index": file_index,
+                                    "queries": len(queries),
+                                    "sentences": nsentences[file_index],
+                                    "snapshot": snapshot is not None,
+                                    "parse": parsed - start,
+                                    "compile": time.perf_counter() - parsed}
+        records.append(file_records[file_index])
+    # One job per query, or per input file in batch mode
+    jobs = [(file_index,) for file_index in args.inputs] if args.batch else \
+        [(file_index, ind) for file_index in args.inputs
+         for ind in range(1, len(inputs[file_index][0]) + 1)]
+
+    with contextlib.ExitStack() as stack:
+        if args.workers > 1:
+            # Each worker receives the compiled KBs once, then only job ids
+            pool = stack.enter_context(ProcessPoolExecutor(
+                args.workers, initializer=_init_worker,
+                initargs=(SYMBOLS, inputs)))
+            futures = [pool.submit(run, *job, **options) for job in jobs]
+            outcomes = (future.result() for future in futures)
+        else:
+            _init_worker(SYMBOLS, inputs)
+            outcomes = (run(*job, **options) for job in jobs)
+
+        # Report in input order, whatever order the jobs finish in
+        results: Dict[int, List[str]] = {}
+        for job, (result, transcript, metrics, lemma_use) in zip(jobs,
+                                                                outcomes):
+            file_index = job[0]
+            queries, kb = inputs[file_index]
+            if args.batch or job[1] == 1:
+                print("======= INPUT " + str(file_index) + " =========")
+                print("[!] %d queries and %d sentences" %
+                      (len(queries), nsentences[file_index]))
+                printk(list(kb))
+            sys.stdout.write(transcript)
+            results.setdefault(file_index, []).extend(
+                result if args.batch else [result])
+            if metrics is not None:
+                records.append(metrics)
+            if lemma_use is not None:
+                # Summed over the workers' caches; the size is the largest
+                totals = file_records[file_index].setdefault(
+                    "lemmas", dict.fromkeys(lemma_use, 0))
+                for key, value in lemma_use.items():
+                    totals[key] = max(totals[key], value) if key == "size" \
+                        else totals[key] + value
+                if args.batch or job[1] == len(queries):
+                    print("[!] Lemma cache: %(hits)d hits, %(misses)d "
+                          "misses, %(evictions)d evictions, %(size)d "
+                          "entries" % totals)
+
+    wait_renders()
+    if args.profile:
+        for file_index in args.inputs:
+            merge_profiles(file_index, len(inputs[file_index][0]))
+    if args.metrics is not None:
+        write_jsonl(args.metrics, records)
+
+    # Output results
+    for file_index in args.inputs:
+        with open("output/output%d.txt" % file_index, "w") as f:
+            for r in results.get(file_index, []):
+                f.write(r + "\n")
 
 
 if __name__ == "__main__":
-    CUTOFF = 100000
-    for FILE_INDEX in range(1, 12):
-        print("======= INPUT " + str(FILE_INDEX) + " =========")
-        queries, k_base = parse_input("cases/input%d.txt" % FILE_INDEX)
-        print("[!] %d queries and %d sentences" % (len(queries), len(k_base)))
-        ResGraph = ResolutionGraph(FILE_INDEX)
-        results = []
-
-        ind = 0
-        # Try each query
-        for q in queries:
-            ind += 1
-            MATCHES: List[str] = []
-            print("=>", q)
-            printk(k_base)
-            if prove_by_resolution(k_base, q):
-                results.append("TRUE")
-            else:
-                results.append("FALSE")
-            write_matches(ind)
-            ResGraph.save()
-            ResGraph = ResGraph.next_query()
-        # Output results
-        with open("output/output%d.txt" % FILE_INDEX, "w") as f:
-            for r in results:
-                f.write(r + "\n")
+    main()
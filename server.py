@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from typing import *
+from lemmas import LemmaCache
+from reader import ParseError
+from realityman import CUTOFF, MAX_LITERALS, KnowledgeBase
+from snapshot import read_snapshot
+from terms import Literal, Sentence
+
+# The knowledge base of a worker process and the number of told sentences
+# applied to it so far
+_KB: Optional[KnowledgeBase] = None
+_TOLD = 0
+
+
+def _init_worker(state: bytes) -> None:
+    global _KB
+    _KB = pickle.loads(state)
+
+
+def _ask(query: Literal, told: int, recent: List[Sentence],
+         options: Dict[str, Any]) -> Tuple[int, str, Optional[str]]:
+    """Answer query once the worker's KB holds the first told sentences;
+    recent are the last of those. Returns the worker's pid with the answer
+    and the reason for an UNKNOWN one."""
+    global _TOLD
+    if _TOLD < told:
+        for sentence in recent[_TOLD - (told - len(recent)):]:
+            _KB.tell(sentence)
+        _TOLD = told
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = _KB.prove(query, **options)
+    return os.getpid(), result.answer.value, result.reason
+
+
+class KnowledgeServer:
+    """Answers TELL and ASK requests, one per line, against a knowledge base
+    compiled once at startup:
+
+        TELL <sentence>  ->  OK, or OK redundant if already entailed by a
+                             stored sentence (a duplicate or subsumer)
+        ASK <literal>    ->  TRUE, FALSE or UNKNOWN <reason>
+        QUIT             ->  closes the connection
+
+    Malformed requests get ERR <message>. Requests on a connection may be
+    pipelined; their replies come back in order.
+
+    ASKs run concurrently on a pool of worker processes, each holding its own
+    copy of the KB. Told sentences go into the server's copy at once, and
+    every ASK carries those its worker may not have applied yet, so it is
+    answered against everything told before it arrived."""
+
+    def __init__(self, kb: KnowledgeBase, workers: int,
+                 **options) -> None:
+        self.kb = kb
+        self.workers = workers
+        self.options = options
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                        initargs=(pickle.dumps(kb),))
+        self.told: List[Sentence] = []
+        # Told sentences applied by each worker, as of its last answer
+        self._applied: Dict[int, int] = {}
+
+    def close(self) -> None:
+        self.pool.shutdown(cancel_futures=True)
+
+    def tell(self, sentence: Sentence) -> str:
+        if not self.kb.tell(sentence):
+            return "OK redundant"
+        self.told.append(sentence)
+        return "OK"
+
+    async def ask(self, query: Literal, told: int) -> str:
+        """The answer to query against the KB and the first told sentences,
+        those told before it arrived."""
+        # Workers that have not answered yet still hold the startup KB
+        known = min(self._applied.values()) \
+            if len(self._applied) >= self.workers else 0
+        pid, answer, reason = await asyncio.get_running_loop().run_in_executor(
+            self.pool, _ask, query, told, self.told[known:told], self.options)
+        self._applied[pid] = max(self._applied.get(pid, 0), told)
+        return answer if reason is None else "%s %s" % (answer, reason)
+
+    def request(self, line: str) -> Awaitable[str]:
+        """The reply to one request line; TELLs take effect right away, and
+        ASKs see exactly the TELLs that came before them."""
+        command, _, argument = line.strip().partition(" ")
+        command = command.upper()
+        try:
+            if command == "TELL":
+                sentence = Sentence(argument)
+                if not sentence.disjoint_literals:
+                    return _done("ERR empty sentence")
+                return _done(self.tell(sentence))
+            if command == "ASK":
+                return asyncio.ensure_future(
+                    self.ask(Literal(argument), len(self.told)))
+        except (ValueError, IndexError) as e:
+            return _done("ERR %s" % (e or "malformed %s" % command))
+        return _done("ERR unknown command %r" % command)
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        replies: asyncio.Queue = asyncio.Queue()
+        sender = asyncio.ensure_future(self._send(replies, writer))
+        try:
+            while True:
+                line = (await reader.readline()).decode("utf-8", "replace")
+                if not line or line.strip().upper() == "QUIT":
+                    break
+                if line.strip():
+                    await replies.put(self.request(line))
+        finally:
+            await replies.put(None)
+            await sender
+            writer.close()
+
+    async def _send(self, replies: asyncio.Queue,
+                    writer: asyncio.StreamWriter) -> None:
+        while True:
+            reply = await replies.get()
+            if reply is None:
+                return
+            try:
+                text = await reply
+            except Exception as e:
+                text = "ERR %s" % e
+            writer.write(text.encode("utf-8") + b"\n")
+            await writer.drain()
+
+
+def _done(reply: str) -> "asyncio.Future[str]":
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(reply)
+    return future
+
+
+def load_kb(path: str, lemmas: Optional[LemmaCache] = None) -> KnowledgeBase:
+    """Compile the sentences of an input file, or load a snapshot (.kb)."""
+    if path.endswith(".kb"):
+        return KnowledgeBase.from_compiled(read_snapshot(path).sentences,
+                                           lemmas)
+    return KnowledgeBase.from_file(path, lemmas=lemmas)[1]
+
+
+async def serve(server: KnowledgeServer, unix: Optional[str] = None,
+                host: str = "127.0.0.1", port: int = 7451) -> None:
+    if unix is not None:
+        listener = await asyncio.start_unix_server(server.handle, unix)
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+    for sock in listener.sockets:
+        print("[!] Serving on", sock.getsockname())
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Serve TELL and ASK requests against a knowledge base "
+                    "over a local socket, one request per line.")
+    parser.add_argument("kb", help="input file whose sentences form the "
+                                   "knowledge base, or a snapshot (.kb)")
+    parser.add_argument("--unix", metavar="PATH",
+                        help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="TCP address to listen on (default: "
+                             "%(default)s)")
+    parser.add_argument("--port", type=int, default=7451,
+                        help="TCP port to listen on (default: %(default)s)")
+    parser.add_argument("-j", "--workers", type=int,
+                        default=os.cpu_count() or 1,
+                        help="worker processes answering ASKs "
+                             "(default: one per CPU)")
+    parser.add_argument("--cutoff", type=int, default=CUTOFF,
+                        help="given sentences per query before answering "
+                             "UNKNOWN (default: %(default)s)")
+    parser.add_argument("--time-limit", type=float, metavar="SECONDS",
+                        help="wall time per query before answering UNKNOWN "
+                             "(default: none)")
+    parser.add_argument("--max-clauses", type=int, metavar="N",
+                        help="sentences generated per query before "
+                             "answering UNKNOWN (default: none)")
+    parser.add_argument("--max-memory", type=int, metavar="MB",
+                        help="resident memory before answering UNKNOWN "
+                             "(default: none)")
+    parser.add_argument("--max-literals", type=int, default=MAX_LITERALS,
+                        metavar="N",
+                        help="drop longer resolvents, answering UNKNOWN "
+                             "rather than FALSE (default: %(default)s)")
+    parser.add_argument("--engine",
+                        choices=["auto", "sld", "datalog", "general"],
+                        default="auto",
+                        help="see realityman.py --help "
+                             "(default: %(default)s)")
+    parser.add_argument("--pick-ratio", type=int, default=4,
+                        help="lightest-first picks per oldest-first pick of "
+                             "the given sentence (default: %(default)s)")
+    parser.add_argument("--lemmas", type=int, default=0, metavar="SIZE",
+                        help="cache up to SIZE settled ground queries per "
+                             "worker (default: off)")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    lemmas = LemmaCache(args.lemmas, remember_units=True) \
+        if args.lemmas else None
+    try:
+        kb = load_kb(args.kb, lemmas)
+    except ParseError as e:
+        parser.exit(1, "%s\n" % e)
+    print("[!] Loaded %d sentences from %s" % (len(kb), args.kb))
+    server = KnowledgeServer(
+        kb, args.workers, cutoff=args.cutoff, pick_ratio=args.pick_ratio,
+        time_limit=args.time_limit, engine=args.engine,
+        clause_limit=args.max_clauses,
+        max_literals=args.max_literals,
+        memory_limit=args.max_memory << 20
+        if args.max_memory is not None else None)
+    try:
+        asyncio.run(serve(server, args.unix, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if args.unix is not None and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+from typing import *
+from budget import Budget, BudgetExhausted
+from terms import SYMBOLS, Parameter, Literal, Sentence, standard_variable
+from unify import Substitution, rename_variables, unify
+
+# Head of the rules made from integrity constraints (sentences without a
+# positive literal): proving it shows the program inconsistent
+FALSE_ATOM = Literal.make(False, SYMBOLS.intern("$false"), ())
+
+# A definite clause: its positive head atom and the atoms of its body
+Rule = Tuple[Literal, Tuple[Literal, ...]]
+
+
+def is_horn(sentences: Iterable[Sentence]) -> bool:
+    """True if no sentence holds more than one positive literal."""
+    for sentence in sentences:
+        positive = 0
+        for lit in sentence.disjoint_literals:
+            if not lit.negated:
+                positive += 1
+                if positive > 1:
+                    return False
+    return True
+
+
+def canonical(literal: Literal) -> Literal:
+    """Variant of literal with standard variable names; variants of one
+    another share it, so it keys the tables."""
+    if literal.contains_only_constants():
+        return literal
+    return rename_variables([literal], standard_variable)[0]
+
+
+_RENAMED: Dict[Tuple[int, int], Parameter] = {}
+
+
+def _variable(family: int, i: int) -> Parameter:
+    # Family 0 names rule variables, family k > 0 the variables of answers
+    # to the k-th body atom. None of them clash with standard variables.
+    var = _RENAMED.get((family, i))
+    if var is None:
+        var = _RENAMED[(family, i)] = \
+            Parameter.variable("_%d_%d" % (family, i))
+    return var
+
+
+def _rename(literals: Sequence[Literal], family: int) -> List[Literal]:
+    return rename_variables(literals, lambda i: _variable(family, i))
+
+
+def _atom(literal: Literal) -> Literal:
+    if not literal.negated:
+        return literal
+    return Literal.make(False, literal.predicate, literal.parameters)
+
+
+class HornProgram:
+    """Goal-directed SLD resolution with tabling over a Horn knowledge base.
+
+    Every call is tabled under its canonical variant together with the
+    answers found for it. A call already being evaluated, or already
+    evaluated during the current pass, is answered from its table instead of
+    being expanded again, and passes repeat until no table grows. Terms are
+    flat, so there are finitely many calls and answers and this terminates
+    on recursive rules too. Tables of completed calls are kept for later
+    queries."""
+
+    def __init__(self, sentences: Iterable[Sentence] = ()) -> None:
+        self.rules: Dict[int, List[Rule]] = {}
+        for sentence in sentences:
+            self.add(sentence.disjoint_literals)
+        self.tables: Dict[Literal, Dict[Literal, None]] = {}
+        self.complete: Set[Literal] = set()
+        self._visited: Set[Literal] = set()
+        self._changed = False
+        self._budget: Optional[Budget] = None
+        self.expansions = 0
+
+    def add(self, literals: Sequence[Literal]) -> None:
+        """Add a Horn clause, as a rule with FALSE_ATOM as head if it has no
+        positive literal."""
+        literals = _rename(literals, 0)
+        head = FALSE_ATOM
+        body = []
+        for lit in literals:
+            if lit.negated:
+                body.append(_atom(lit))
+            else:
+                head = lit
+        self.rules.setdefault(head.predicate, []).append((head, tuple(body)))
+
+    def extend(self, literals: Sequence[Literal]) -> None:
+        """Add a Horn clause after queries have been answered. The tables
+        are dropped, since the clause may add answers to any of them."""
+        self.add(literals)
+        self.tables = {}
+        self.complete = set()
+
+    def with_fact(self, fact: Literal) -> "HornProgram":
+        """A copy with one more fact and tables of its own."""
+        program = HornProgram()
+        program.rules = {p: list(rules) for p, rules in self.rules.items()}
+        program.add([fact])
+        return program
+
+    def prove(self, goal: Literal, budget: Optional[Budget] = None) -> bool:
+        """Is some instance of the atom goal a consequence of the program?
+        Raises BudgetExhausted if the budget runs out first."""
+        key = canonical(goal)
+        self._budget = budget
+        try:
+            while True:
+                self._visited = set()
+                self._changed = False
+                if self._solve(key):
+                    return True
+                if not self._changed:
+                    # Nothing evaluated in this pass can gain answers
+                    self.complete |= self._visited
+                    return False
+        finally:
+            self._budget = None
+
+    def _solve(self, key: Literal) -> Dict[Literal, None]:
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = {}
+        if key in self.complete or key in self._visited:
+            return table
+        self._visited.add(key)
+
+        for head, body in self.rules.get(key.predicate, ()):
+            subst = unify(key, head)
+            if subst is None:
+                continue
+            self.expansions += 1
+            if self._budget is not None:
+                reason = self._budget.exhausted(self.expansions, 0)
+                if reason is not None:
+                    raise BudgetExhausted(reason)
+            for solution in self._solve_body(body, 0, subst):
+                answer = canonical(solution.apply(key))
+                if answer not in table:
+                    table[answer] = None
+                    self._changed = True
+        return table
+
+    def _solve_body(self, body: Tuple[Literal, ...], i: int,
+                    subst: Substitution) -> Iterator[Substitution]:
+        if i == len(body):
+            yield subst
+            return
+        goal = subst.apply(body[i])
+        # The table may grow while its answers are being consumed
+        for answer in list(self._solve(canonical(goal))):
+            if not answer.contains_only_constants():
+                answer = _rename([answer], i + 1)[0]
+            extended = unify(goal, answer, Substitution(dict(subst.bindings)))
+            if extended is not None:
+                yield from self._solve_body(body, i + 1, extended)
@@ -0,0 +1,143 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import *
+from terms import SYMBOLS, Parameter, Literal, Sentence
+
+MAGIC = b"RMKB"
+VERSION = 1
+
+# Magic, version, then the number of symbols, bytes of symbol names,
+# queries, input sentences, stored sentences, literals and parameters
+_HEADER = struct.Struct("<4s8I")
+
+
+class Snapshot(NamedTuple):
+    queries: List[Literal]
+    sentences: List[Sentence]
+    input_sentences: int  # Sentences in the input, before compiling
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b"\0" * (-len(data) % 4)
+
+
+def write_snapshot(path: str, queries: Sequence[Literal],
+                   sentences: Iterable[Sentence],
+                   input_sentences: int) -> None:
+    """Write the queries and compiled sentences of an input file to path.
+
+    Every table is a little-endian int32 array, so a snapshot is read back
+    in place from a memory map. Only the symbols used are stored, and ids
+    are remapped when the snapshot is read into another symbol table.
+    Literals are stored as predicate << 1 | negated, and parameters as
+    symbol << 1 | is_var; queries come first, as one literal sentences."""
+    clauses = [[q] for q in queries]
+    clauses += [s.disjoint_literals for s in sentences]
+    used = set()
+    for literals in clauses:
+        for lit in literals:
+            used.add(lit.predicate)
+            used.update([p.id for p in lit.parameters])
+    # Interning the symbols in their current order when reading keeps the
+    # literals of every sentence in the same order
+    symbols = {sid: i for i, sid in enumerate(sorted(used))}
+
+    clause_ends = array("i")
+    heads = array("i")
+    literal_ends = array("i")
+    params = array("i")
+    for literals in clauses:
+        for lit in literals:
+            heads.append(symbols[lit.predicate] << 1 | lit.negated)
+            for p in lit.parameters:
+                params.append(symbols[p.id] << 1 | p.is_var)
+            literal_ends.append(len(params))
+        clause_ends.append(len(heads))
+    names = b"\0".join([SYMBOLS.names[sid].encode("utf-8")
+                        for sid in symbols])
+    tables = [clause_ends, heads, literal_ends, params]
+    if sys.byteorder != "little":
+        for table in tables:
+            table.byteswap()
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(symbols), len(names),
+                             len(queries), input_sentences,
+                             len(clauses) - len(queries), len(heads),
+                             len(params)))
+        f.write(_pad(names))
+        for table in tables:
+            f.write(table.tobytes())
+    # Readers never see a partly written snapshot
+    os.replace(tmp, path)
+
+
+def _table(buffer, offset: int, length: int) -> List[int]:
+    """length int32s at offset, converted to ints in one go."""
+    with memoryview(buffer)[offset:offset + 4 * length] as view:
+        if sys.byteorder == "little":
+            with view.cast("i") as ints:
+                return ints.tolist()
+        table = array("i", view)
+    table.byteswap()
+    return table.tolist()
+
+
+def read_snapshot(path: str) -> Snapshot:
+    """Read a snapshot written by write_snapshot. Raises ValueError if path
+    is not a snapshot of this version."""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return _read(mapped, path)
+    finally:
+        mapped.close()
+
+
+def _read(mapped, path: str) -> Snapshot:
+    if len(mapped) < _HEADER.size:
+        raise ValueError("%s: not a snapshot" % path)
+    magic, version, nsymbols, name_bytes, nqueries, input_sentences, \
+        nsentences, nliterals, nparams = _HEADER.unpack_from(mapped)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("%s: not a version %d snapshot" % (path, VERSION))
+    offset = _HEADER.size
+    names = bytes(mapped[offset:offset + name_bytes]).decode("utf-8")
+    offset += name_bytes + (-name_bytes % 4)
+    ids = [SYMBOLS.intern(name) for name in names.split("\0")] \
+        if nsymbols else []
+    nclauses = nqueries + nsentences
+    if len(mapped) < offset + 4 * (nclauses + 2 * nliterals + nparams):
+        raise ValueError("%s: truncated snapshot" % path)
+
+    tables = []
+    for length in (nclauses, nliterals, nliterals, nparams):
+        tables.append(_table(mapped, offset, length))
+        offset += 4 * length
+    clause_ends, heads, literal_ends, codes = tables
+
+    parameters: Dict[int, Parameter] = {}
+    for code in set(codes):
+        name = SYMBOLS.names[ids[code >> 1]]
+        parameters[code] = Parameter.variable(name) if code & 1 \
+            else Parameter(name)
+    params = [parameters[code] for code in codes]
+    literals = []
+    start = 0
+    for head, end in zip(heads, literal_ends):
+        literals.append(Literal.make(bool(head & 1), ids[head >> 1],
+                                     tuple(params[start:end])))
+        start = end
+    clauses = []
+    start = 0
+    for end in clause_ends:
+        clauses.append(literals[start:end])
+        start = end
+    return Snapshot([literals[0] for literals in clauses[:nqueries]],
+                    [Sentence.from_literals(literals)
+                     for literals in clauses[nqueries:]],
+                    input_sentences)
@@ -0,0 +1,365 @@
+import heapq
+import time
+from collections import deque
+from typing import *
+from index import DiscriminationTree, PredicateIndex
+
+
+def clause_key(sentence) -> FrozenSet:
+    """Order independent key under which identical clauses collide."""
+    return frozenset(sentence.disjoint_literals)
+
+
+def clause_features(sentence) -> FrozenSet:
+    """Features that must all reappear in any clause this one subsumes: the
+    number of literals per (predicate, polarity) and the constants at each
+    argument position."""
+    features = set()
+    counts: Dict[Tuple[int, bool], int] = {}
+    for lit in sentence.disjoint_literals:
+        n = counts.get((lit.predicate, lit.negated), 0)
+        counts[(lit.predicate, lit.negated)] = n + 1
+        features.add((lit.predicate, lit.negated, -1 - n))
+        for i, p in enumerate(lit.parameters):
+            if not p.is_var:
+                features.add((lit.predicate, lit.negated, i, p.id))
+    return frozenset(features)
+
+
+# Matching steps one subsumption check may take. Matching long clauses of
+# one predicate backtracks exponentially; a check that runs out of steps, or
+# past the deadline, reports no subsumption, which only costs redundancy.
+SUBSUMPTION_STEPS = 1000
+
+
+class _GiveUp(Exception):
+    pass
+
+
+def subsumes(general, specific, steps: int = SUBSUMPTION_STEPS,
+             deadline: Optional[float] = None) -> bool:
+    """True if some substitution maps each literal of general onto a distinct
+    literal of specific, as far as steps matching attempts before the
+    perf_counter deadline can tell. Distinctness keeps this sound without
+    factoring."""
+    targets = specific.disjoint_literals
+    if len(general.disjoint_literals) > len(targets):
+        return False
+    # Find the literals each general literal matches on its own first. Most
+    # attempts fail here; the rest backtrack most constrained literal first.
+    candidates = []
+    for lit in general.disjoint_literals:
+        matches = [j for j, t in enumerate(targets)
+                   if t.predicate == lit.predicate and t.negated == lit.negated
+                   and _match_parameters(lit.parameters, t.parameters,
+                                         {}) is not None]
+        if not matches:
+            return False
+        candidates.append((len(matches), lit, matches))
+    candidates.sort(key=lambda c: c[0])
+    try:
+        return _match_literals(candidates, 0, targets, {}, set(),
+                               [steps, deadline])
+    except _GiveUp:
+        return False
+
+
+def _match_literals(candidates, i, targets, binding, used, limits) -> bool:
+    if i == len(candidates):
+        return True
+    _, lit, matches = candidates[i]
+    for j in matches:
+        if j in used:
+            continue
+        limits[0] -= 1
+        if limits[0] <= 0 or limits[0] % 64 == 0 and \
+                limits[1] is not None and time.perf_counter() >= limits[1]:
+            raise _GiveUp
+        extended = _match_parameters(lit.parameters, targets[j].parameters,
+                                     binding)
+        if extended is not None:
+            used.add(j)
+            if _match_literals(candidates, i + 1, targets, extended, used,
+                               limits):
+                return True
+            used.discard(j)
+    return False
+
+
+def _match_parameters(params, targets, binding):
+    # One-way matching: only variables of the general side are bound
+    extended = binding
+    for p, t in zip(params, targets):
+        if p.is_var:
+            bound = extended.get(p)
+            if bound is None:
+                if extended is binding:
+                    extended = dict(binding)
+                extended[p] = t
+            elif bound is not t:
+                return None
+        elif p is not t:
+            return None
+    return extended
+
+
+class ClauseStore:
+    """Clause set with O(1) duplicate detection and indexed subsumption.
+
+    Clauses get dense, stable ids in insertion order. Retired clauses leave a
+    None behind so the ids of the remaining clauses never change.
+
+    Literals are also kept in a discrimination tree, so resolution partners
+    and subsumption candidates are retrieved by their arguments as well as
+    their predicate: a ground fact only ever meets the clauses whose
+    literals can actually match it.
+
+    A store created with a base is a copy-on-write overlay: it sees every
+    clause of the base, numbers its own clauses after them, and records
+    retirements of base clauses locally, so the base is never modified and
+    can be shared by many overlays as long as it does not change itself."""
+
+    def __init__(self, base: Optional["ClauseStore"] = None) -> None:
+        self.base = base
+        self.offset = base.size() if base is not None else 0
+        self.clauses: List[Optional[Any]] = []
+        self.index = PredicateIndex()
+        self.terms = DiscriminationTree()
+        self._keys: Dict[FrozenSet, int] = {}
+        # Number of distinct literals per clause
+        self._sizes: List[int] = []
+        self._features: List[FrozenSet] = []
+        # Base clauses retired in this overlay
+        self._hidden: Set[int] = set()
+        self.live = base.live if base is not None else 0
+        self.retired = 0
+        # perf_counter time after which subsumption checks give up
+        self.deadline: Optional[float] = None
+
+    def __len__(self) -> int:
+        return self.live
+
+    def __iter__(self):
+        return (self.get(i) for i in self.ids())
+
+    def __contains__(self, sentence) -> bool:
+        return self._find(clause_key(sentence)) is not None
+
+    def size(self) -> int:
+        """Number of ids handed out so far, retired ones included."""
+        return self.offset + len(self.clauses)
+
+    def get(self, clause_id: int):
+        if clause_id < self.offset:
+            if clause_id in self._hidden:
+                return None
+            return self.base.get(clause_id)
+        return self.clauses[clause_id - self.offset]
+
+    def ids(self) -> List[int]:
+        ids = [i for i in self.base.ids() if i not in self._hidden] \
+            if self.base is not None else []
+        ids += [self.offset + i for i, s in enumerate(self.clauses)
+                if s is not None]
+        return ids
+
+    def lookup(self, predicate: int, negated: bool) -> List[int]:
+        """Ids of live clauses holding a literal with this predicate/polarity."""
+        ids = list(self.index.lookup(predicate, negated))
+        if self.base is not None:
+            base_ids = self.base.lookup(predicate, negated)
+            if self._hidden:
+                base_ids = [i for i in base_ids if i not in self._hidden]
+            ids = base_ids + ids
+        return ids
+
+    def _retrieve(self, literal, mode: str) -> List[Tuple[Any, Iterable[int]]]:
+        """Stored literals from the term index with the ids of the live
+        clauses holding them; mode names a DiscriminationTree retrieval
+        method."""
+        found = getattr(self.terms, mode)(literal)
+        if self.base is not None:
+            base_found = self.base._retrieve(literal, mode)
+            if self._hidden:
+                base_found = [(stored, [i for i in ids
+                                        if i not in self._hidden])
+                              for stored, ids in base_found]
+            found = base_found + found
+        return found
+
+    def complementary(self, sentence) -> Set[int]:
+        """Ids of clauses holding a literal that unifies with the complement
+        of one in sentence."""
+        ids: Set[int] = set()
+        for lit in sentence.disjoint_literals:
+            for _, clause_ids in self._retrieve(lit.negate(), "unifiable"):
+                ids.update(clause_ids)
+        return ids
+
+    def add(self, sentence) -> Optional[int]:
+        """Insert sentence unless it is a duplicate or subsumed, retiring any
+        stored clauses it subsumes. Returns the new id or None."""
+        key = clause_key(sentence)
+        if self._find(key) is not None:
+            return None
+        features = clause_features(sentence)
+        if self.is_subsumed(sentence, features):
+            return None
+        for clause_id in self.subsumed_by(sentence, features):
+            self.retire(clause_id)
+        return self._insert(sentence, key, features)
+
+    def insert(self, sentence) -> int:
+        """Insert sentence without looking for duplicates or subsumption,
+        e.g. when reloading the clauses of a store. Returns the new id."""
+        return self._insert(sentence, clause_key(sentence),
+                            clause_features(sentence))
+
+    def _insert(self, sentence, key: FrozenSet, features: FrozenSet) -> int:
+        clause_id = self.size()
+        self.clauses.append(sentence)
+        self._keys[key] = clause_id
+        self._sizes.append(len(key))
+        self._features.append(features)
+        self.index.add(clause_id, sentence)
+        self.terms.add(clause_id, sentence)
+        self.live += 1
+        return clause_id
+
+    def retire(self, clause_id: int) -> None:
+        if clause_id < self.offset:
+            self._hidden.add(clause_id)
+        else:
+            sentence = self.clauses[clause_id - self.offset]
+            self.clauses[clause_id - self.offset] = None
+            del self._keys[clause_key(sentence)]
+            self.index.remove(clause_id, sentence)
+            self.terms.remove(clause_id, sentence)
+        self.live -= 1
+        self.retired += 1
+
+    def _find(self, key: FrozenSet) -> Optional[int]:
+        clause_id = self._keys.get(key)
+        if clause_id is None and self.base is not None:
+            clause_id = self.base._find(key)
+            if clause_id in self._hidden:
+                return None
+        return clause_id
+
+    def _size(self, clause_id: int) -> int:
+        if clause_id < self.offset:
+            return self.base._size(clause_id)
+        return self._sizes[clause_id - self.offset]
+
+    def _feature_set(self, clause_id: int) -> FrozenSet:
+        if clause_id < self.offset:
+            return self.base._feature_set(clause_id)
+        return self._features[clause_id - self.offset]
+
+    def is_subsumed(self, sentence,
+                    features: Optional[FrozenSet] = None) -> bool:
+        """Forward subsumption: is sentence subsumed by a stored clause?"""
+        # A candidate must have every literal generalize one of sentence's
+        general: Dict[Any, List[Iterable[int]]] = {}
+        for lit in sentence.disjoint_literals:
+            # A literal may be stored both here and in the base
+            found: Dict[Any, List[Iterable[int]]] = {}
+            for stored, ids in self._retrieve(lit, "generalizations"):
+                found.setdefault(stored, []).append(ids)
+            for stored, groups in found.items():
+                general.setdefault(stored, groups)
+        hits: Dict[int, int] = {}
+        for groups in general.values():
+            for ids in groups:
+                for clause_id in ids:
+                    hits[clause_id] = hits.get(clause_id, 0) + 1
+        if not hits:
+            return False
+        if features is None:
+            features = clause_features(sentence)
+        for clause_id, count in hits.items():
+            if count == self._size(clause_id) and \
+                    self._feature_set(clause_id) <= features and \
+                    subsumes(self.get(clause_id), sentence,
+                             deadline=self.deadline):
+                return True
+        return False
+
+    def subsumed_by(self, sentence,
+                    features: Optional[FrozenSet] = None) -> List[int]:
+        """Backward subsumption: ids of stored clauses sentence subsumes."""
+        # A candidate must hold an instance of every literal of sentence
+        postings = []
+        for lit in sentence.disjoint_literals:
+            ids: Set[int] = set()
+            for _, clause_ids in self._retrieve(lit, "instances"):
+                ids.update(clause_ids)
+            postings.append(ids)
+        postings.sort(key=len)
+        if not postings or not postings[0]:
+            return []
+        candidates = postings[0]
+        for ids in postings[1:]:
+            candidates.intersection_update(ids)
+            if not candidates:
+                return []
+        if features is None:
+            features = clause_features(sentence)
+        return [clause_id for clause_id in candidates
+                if features <= self._feature_set(clause_id)
+                and subsumes(sentence, self.get(clause_id),
+                             deadline=self.deadline)]
+
+
+def clause_weight(sentence) -> int:
+    """Symbol count of a clause; lighter clauses are selected first."""
+    return sum([1 + len(l.parameters) for l in sentence.disjoint_literals])
+
+
+class ClauseQueue:
+    """Unprocessed clauses of the given-clause loop.
+
+    Clauses are normally selected lightest first from a heap. Every
+    (pick_ratio + 1)-th selection takes the oldest clause instead, so heavy
+    clauses are not starved. A pick_ratio of 0 gives breadth-first order."""
+
+    def __init__(self, pick_ratio: int = 4) -> None:
+        self.pick_ratio = pick_ratio
+        self._by_weight: List[Tuple[int, int, Any]] = []
+        self._by_age: Deque[Tuple[int, Any]] = deque()
+        # Age of every queued clause by key; entries in the heap or the
+        # deque whose age is no longer in here were selected via the other
+        self._queued: Dict[FrozenSet, int] = {}
+        self._age = 0
+        self._picks = 0
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    def __contains__(self, sentence) -> bool:
+        return clause_key(sentence) in self._queued
+
+    def push(self, sentence) -> bool:
+        key = clause_key(sentence)
+        if key in self._queued:
+            return False
+        self._age += 1
+        self._queued[key] = self._age
+        heapq.heappush(self._by_weight,
+                       (clause_weight(sentence), self._age, sentence))
+        self._by_age.append((self._age, sentence))
+        return True
+
+    def pop(self):
+        self._picks += 1
+        by_age = self.pick_ratio == 0 or \
+            self._picks % (self.pick_ratio + 1) == 0
+        while True:
+            if by_age:
+                age, sentence = self._by_age.popleft()
+            else:
+                _, age, sentence = heapq.heappop(self._by_weight)
+            key = clause_key(sentence)
+            if self._queued.get(key) == age:
+                del self._queued[key]
+                return sentence
@@ -0,0 +1,284 @@
+from typing import *
+
+
+class SymbolTable:
+    """Interns predicate, constant and variable names to dense integer ids."""
+    __slots__ = ("ids", "names")
+
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def intern(self, name: str) -> int:
+        sid = self.ids.get(name)
+        if sid is None:
+            sid = len(self.names)
+            self.ids[name] = sid
+            self.names.append(name)
+        return sid
+
+    def name(self, sid: int) -> str:
+        return self.names[sid]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __reduce__(self):
+        return _symbols, (self.names,)
+
+
+# Shared by every term in the process; ids are only meaningful locally, which
+# is why the term classes pickle themselves by name.
+SYMBOLS = SymbolTable()
+
+
+def _symbols(names: List[str]) -> SymbolTable:
+    """Unpickle into the process-wide table. Pickling SYMBOLS ahead of
+    structures holding raw ids (indexes, features) makes those ids valid in
+    the receiving process, which must not have interned other names yet."""
+    for sid, name in enumerate(names):
+        if SYMBOLS.intern(name) != sid:
+            raise ValueError("Symbol table conflict for %r" % name)
+    return SYMBOLS
+
+
+# Names the input syntax can produce, and generated names such as "_0" or
+# "x1", which are kept apart so the parser can never hand them out
+_PARAMETERS: Dict[str, "Parameter"] = {}
+_INTERNAL: Dict[str, "Parameter"] = {}
+
+
+class Parameter:
+    """A constant or variable. Instances are interned, so identity is equality
+    and the default identity hash is used as-is."""
+    __slots__ = ("id", "is_var")
+
+    def __new__(cls, param_string: str) -> "Parameter":
+        param = _PARAMETERS.get(param_string)
+        if param is not None:
+            return param
+        if len(param_string) == 1 and param_string.islower():  # Variable
+            param = cls._make(param_string, True)
+        elif param_string and param_string[0].isupper():  # Constant
+            param = cls._make(param_string, False)
+        else:
+            raise ValueError("Malformed parameter %r" % param_string)
+        _PARAMETERS[param_string] = param
+        return param
+
+    @classmethod
+    def variable(cls, name: str) -> "Parameter":
+        """Intern a variable name, including ones the input syntax disallows."""
+        if len(name) == 1 and name.islower():
+            return cls(name)
+        param = _INTERNAL.get(name)
+        if param is None:
+            param = _INTERNAL[name] = cls._make(name, True)
+        return param
+
+    @classmethod
+    def _make(cls, name: str, is_var: bool) -> "Parameter":
+        param = object.__new__(cls)
+        param.id = SYMBOLS.intern(name)
+        param.is_var = is_var
+        return param
+
+    @property
+    def name(self) -> str:
+        return SYMBOLS.names[self.id]
+
+    def __reduce__(self):
+        return _parameter, (self.name, self.is_var)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self) -> str:
+        return SYMBOLS.names[self.id]
+
+
+def _parameter(name: str, is_var: bool) -> Parameter:
+    if is_var:
+        return Parameter.variable(name)
+    return Parameter(name)
+
+
+_STANDARD_NAMES = "xyzuvw"
+_STANDARD: List[Parameter] = []
+_APART: List[Parameter] = []
+
+
+def standard_variable(i: int) -> Parameter:
+    """The i-th variable clauses are renamed to: x, y, z, u, v, w, x1, ..."""
+    while len(_STANDARD) <= i:
+        n = len(_STANDARD)
+        name = _STANDARD_NAMES[n % 6] + (str(n // 6) if n >= 6 else "")
+        _STANDARD.append(Parameter.variable(name))
+    return _STANDARD[i]
+
+
+def apart_variable(i: int) -> Parameter:
+    """The i-th variable used to standardize a clause apart. The input syntax
+    cannot produce these names, so they never clash with a stored clause."""
+    while len(_APART) <= i:
+        _APART.append(Parameter.variable("_%d" % len(_APART)))
+    return _APART[i]
+
+
+class Literal:
+    """An immutable, possibly negated atom over interned symbols."""
+    __slots__ = ("negated", "predicate", "parameters", "_hash")
+
+    def __init__(self, literal_string: str) -> None:
+        self.parse_literal_string(literal_string)
+
+    @classmethod
+    def make(cls, negated: bool, predicate: int,
+             parameters: Tuple[Parameter, ...]) -> "Literal":
+        lit = object.__new__(cls)
+        lit.negated = negated
+        lit.predicate = predicate
+        lit.parameters = parameters
+        lit._hash = hash((negated, predicate, parameters))
+        return lit
+
+    def negate(self) -> "Literal":
+        return Literal.make(not self.negated, self.predicate, self.parameters)
+
+    def with_parameters(self, parameters: Sequence[Parameter]) -> "Literal":
+        return Literal.make(self.negated, self.predicate, tuple(parameters))
+
+    @property
+    def predicate_name(self) -> str:
+        return SYMBOLS.names[self.predicate]
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Literal) or self._hash != other._hash:
+            return False
+        return (self.negated == other.negated
+                and self.predicate == other.predicate
+                and self.parameters == other.parameters)
+
+    def __hash__(self):
+        return self._hash
+
+    def copy(self):
+        return self
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return _literal, (self.negated, self.predicate_name, self.parameters)
+
+    def contains_only_constants(self) -> bool:
+        for p in self.parameters:
+            if p.is_var:
+                return False
+        return True
+
+    def parse_literal_string(self, literal_string: str) -> None:
+        negation = literal_string[:1] == "~"
+        if negation:  # Chop off negation symbol
+            literal_string = literal_string[1:]
+
+        predicate, paren, params = literal_string.partition("(")
+        if not paren or not params.endswith(")") or not predicate or \
+                not predicate.isidentifier():
+            raise ValueError("Malformed literal %r" % literal_string)
+
+        parameters = []
+        for param in params[:-1].split(","):
+            # Parameters are interned, so most lookups end right here
+            p = _PARAMETERS.get(param)
+            if p is None:
+                p = Parameter(param.strip())
+            parameters.append(p)
+
+        self.negated = negation
+        self.predicate = SYMBOLS.intern(predicate)
+        self.parameters = tuple(parameters)
+        self._hash = hash((self.negated, self.predicate, self.parameters))
+
+    def __repr__(self):
+        result = "~" if self.negated else ""
+        return result + SYMBOLS.names[self.predicate] + "(" + ",".join(
+            [SYMBOLS.names[p.id] for p in self.parameters]) + ")"
+
+
+def _literal(negated: bool, predicate: str,
+             parameters: Tuple[Parameter, ...]) -> Literal:
+    return Literal.make(negated, SYMBOLS.intern(predicate), parameters)
+
+
+class Sentence:
+    """An immutable disjunction of literals, kept sorted by predicate."""
+    __slots__ = ("disjoint_literals", "_hash")
+
+    def __init__(self, sentence_string: str) -> None:
+        self.parse_sentence_string(sentence_string)
+
+    @classmethod
+    def from_literals(cls, literals: Iterable[Literal]) -> "Sentence":
+        sent = object.__new__(cls)
+        sent.disjoint_literals = tuple(
+            sorted(literals, key=lambda l: l.predicate))
+        sent._hash = hash(sent.disjoint_literals)
+        return sent
+
+    def clone(self):
+        return self
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return Sentence.from_literals, (self.disjoint_literals,)
+
+    def parse_sentence_string(self, sentence_string: str) -> None:
+        disjoint_literals = []
+        for lit in sentence_string.split("|"):
+            lit = lit.strip()
+            if lit:
+                disjoint_literals.append(Literal(lit))
+        self.disjoint_literals = tuple(
+            sorted(disjoint_literals, key=lambda l: l.predicate))
+        self._hash = hash(self.disjoint_literals)
+
+    def contains_only_constants(self) -> bool:
+        for l in self.disjoint_literals:
+            if not l.contains_only_constants():
+                return False
+        return True
+
+    def __repr__(self):
+        return "|".join([repr(l) for l in self.disjoint_literals])
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Sentence) or self._hash != other._hash:
+            return False
+        return self.disjoint_literals == other.disjoint_literals
+
+    def __hash__(self):
+        return self._hash
+
+    def __len__(self) -> int:
+        return len(self.disjoint_literals)
+
+    def to_literal(self) -> Literal:
+        assert len(self.disjoint_literals) == 1
+
+        return self.disjoint_literals[0]
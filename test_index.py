@@ -0,0 +1,47 @@
+import unittest
+from index import DiscriminationTree
+from terms import Literal, Sentence
+
+
+class DiscriminationTreeTest(unittest.TestCase):
+    """Retrieval around literals with a repeated variable, whose paths alone
+    do not decide a match."""
+
+    def setUp(self):
+        self.tree = DiscriminationTree()
+        self.stored = ["P(x,x)", "P(A,B)", "P(A,A)", "P(y,z)"]
+        for clause_id, text in enumerate(self.stored):
+            self.tree.add(clause_id, Sentence(text))
+
+    def found(self, mode: str, text: str) -> set:
+        return {self.stored[clause_id]
+                for _, ids in getattr(self.tree, mode)(Literal(text))
+                for clause_id in ids}
+
+    def test_unifiable(self):
+        self.assertEqual(self.found("unifiable", "P(A,B)"),
+                         {"P(A,B)", "P(y,z)"})
+        self.assertEqual(self.found("unifiable", "P(u,u)"),
+                         {"P(x,x)", "P(A,A)", "P(y,z)"})
+
+    def test_generalizations(self):
+        self.assertEqual(self.found("generalizations", "P(A,B)"),
+                         {"P(A,B)", "P(y,z)"})
+        self.assertEqual(self.found("generalizations", "P(A,A)"),
+                         {"P(x,x)", "P(A,A)", "P(y,z)"})
+
+    def test_instances(self):
+        self.assertEqual(self.found("instances", "P(u,u)"),
+                         {"P(x,x)", "P(A,A)"})
+        self.assertEqual(self.found("instances", "P(A,v)"),
+                         {"P(A,B)", "P(A,A)"})
+
+    def test_remove_prunes(self):
+        for clause_id, text in enumerate(self.stored):
+            self.tree.remove(clause_id, Sentence(text))
+        self.assertEqual(self.tree.root, {})
+        self.assertEqual(self.found("unifiable", "P(u,u)"), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from server import KnowledgeServer, load_kb
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class KnowledgeServerTest(unittest.TestCase):
+    """Requests pipelined on one connection, against cases/input3.txt."""
+
+    def converse(self, *lines: str) -> list:
+        server = KnowledgeServer(
+            load_kb(os.path.join(HERE, "cases", "input3.txt")), 1)
+
+        async def run() -> list:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "kb.sock")
+                listener = await asyncio.start_unix_server(server.handle,
+                                                           path)
+                async with listener:
+                    reader, writer = await asyncio.open_unix_connection(path)
+                    # All at once, so the server reads them back to back
+                    writer.write("".join(l + "\n" for l in lines).encode())
+                    await writer.drain()
+                    replies = [(await reader.readline()).decode().strip()
+                               for _ in lines]
+                    writer.close()
+                    return replies
+
+        try:
+            return asyncio.run(run())
+        finally:
+            server.close()
+
+    def test_ask_ignores_later_tells(self):
+        self.assertEqual(
+            self.converse("ASK Foo(A)", "TELL Foo(A)", "ASK Foo(A)"),
+            ["FALSE", "OK", "TRUE"])
+
+    def test_empty_tell(self):
+        self.assertEqual(self.converse("TELL", "TELL  ", "TELL Foo(A)"),
+                         ["ERR empty sentence", "ERR empty sentence", "OK"])
+
+
+if __name__ == "__main__":
+    unittest.main()
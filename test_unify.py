@@ -0,0 +1,41 @@
+import unittest
+from terms import Sentence
+from unify import canonical_clause, factors
+
+
+def canonical(text: str):
+    return canonical_clause(Sentence(text).disjoint_literals)
+
+
+class CanonicalClauseTest(unittest.TestCase):
+
+    def test_variants_collapse(self):
+        self.assertEqual(canonical("~F(x) | G(x)"), canonical("~F(y) | G(y)"))
+        self.assertEqual(canonical("~F(x) | G(x)"), canonical("G(z) | ~F(z)"))
+        self.assertEqual(canonical("R(x,y) | R(y,x)"),
+                         canonical("R(v,u) | R(u,v)"))
+
+    def test_non_variants_stay_apart(self):
+        self.assertNotEqual(canonical("P(x,y)"), canonical("P(x,x)"))
+        self.assertNotEqual(canonical("~F(x) | G(y)"),
+                            canonical("~F(x) | G(x)"))
+
+    def test_duplicates_merged(self):
+        self.assertEqual(len(canonical("P(x) | Q(A) | P(x)")), 2)
+
+    def test_tautologies_dropped(self):
+        self.assertIsNone(canonical("P(x) | Q(y) | ~P(x)"))
+        self.assertIsNotNone(canonical("P(x) | ~P(y)"))
+
+
+class FactorsTest(unittest.TestCase):
+
+    def test_factors(self):
+        self.assertEqual(factors(Sentence("P(x) | P(y)")), [canonical("P(x)")])
+        self.assertEqual(set(factors(Sentence("P(x,A) | P(B,y) | Q(x)"))),
+                         {canonical("P(B,A) | Q(B)")})
+        self.assertEqual(factors(Sentence("P(A) | P(B) | ~P(x)")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,224 @@
+import time
+from typing import *
+from terms import (Parameter, Literal, Sentence, apart_variable,
+                   standard_variable)
+
+
+class Substitution:
+    """Variable bindings of a most general unifier.
+
+    Bindings may chain (x -> y -> John), so lookups dereference. Terms are
+    flat, i.e. constants and variables only, so the occurs check reduces to
+    refusing to bind a variable to itself."""
+    __slots__ = ("bindings",)
+
+    def __init__(self,
+                 bindings: Optional[Dict[Parameter, Parameter]] = None) -> None:
+        self.bindings = {} if bindings is None else bindings
+
+    def deref(self, term: Parameter) -> Parameter:
+        bindings = self.bindings
+        while term.is_var:
+            bound = bindings.get(term)
+            if bound is None:
+                break
+            term = bound
+        return term
+
+    def occurs(self, var: Parameter, term: Parameter) -> bool:
+        return self.deref(term) is var
+
+    def bind(self, var: Parameter, term: Parameter) -> bool:
+        if self.occurs(var, term):
+            return False
+        self.bindings[var] = term
+        return True
+
+    def apply(self, literal: Literal) -> Literal:
+        if not self.bindings:
+            return literal
+        params = tuple([self.deref(p) for p in literal.parameters])
+        if params == literal.parameters:
+            return literal
+        return Literal.make(literal.negated, literal.predicate, params)
+
+    def __repr__(self) -> str:
+        return "{" + ", ".join(["%s/%s" % (v, self.deref(v))
+                                for v in self.bindings]) + "}"
+
+
+def unify(lit1: Literal, lit2: Literal,
+          subst: Optional[Substitution] = None) -> Optional[Substitution]:
+    """Extend subst (or a fresh substitution) to a most general unifier of the
+    arguments of two literals. Returns None if they clash; subst may have been
+    partially extended in that case."""
+    if lit1.predicate != lit2.predicate or \
+            len(lit1.parameters) != len(lit2.parameters):
+        return None
+    if subst is None:
+        subst = Substitution()
+    for p1, p2 in zip(lit1.parameters, lit2.parameters):
+        p1 = subst.deref(p1)
+        p2 = subst.deref(p2)
+        if p1 is p2:
+            continue
+        if p1.is_var:
+            if not subst.bind(p1, p2):
+                return None
+        elif p2.is_var:
+            if not subst.bind(p2, p1):
+                return None
+        else:  # Both are constants, and different ones
+            return None
+    return subst
+
+
+def rename_variables(literals: Iterable[Literal], fresh) -> List[Literal]:
+    """Rename variables in order of first appearance to fresh(0), fresh(1)..."""
+    mapping: Dict[Parameter, Parameter] = {}
+    renamed = []
+    for lit in literals:
+        params = []
+        for p in lit.parameters:
+            if p.is_var:
+                q = mapping.get(p)
+                if q is None:
+                    q = mapping[p] = fresh(len(mapping))
+                p = q
+            params.append(p)
+        params = tuple(params)
+        if params != lit.parameters:
+            lit = Literal.make(lit.negated, lit.predicate, params)
+        renamed.append(lit)
+    return renamed
+
+
+def _shape(literal: Literal) -> Tuple:
+    """Predicate, polarity and arguments of literal, with each variable
+    numbered by its first occurrence in the literal instead of its name."""
+    local: Dict[Parameter, int] = {}
+    return (literal.predicate, literal.negated,
+            tuple([-1 - local.setdefault(p, len(local)) if p.is_var else p.id
+                   for p in literal.parameters]))
+
+
+def canonical_clause(literals: Iterable[Literal]) -> Optional[Sentence]:
+    """The clause of literals in canonical form, or None if it is a
+    tautology: duplicate literals merged, literals in a total order and
+    variables renamed to the standard ones in order of first appearance, so
+    that variants of one clause come out identical.
+
+    Literals are ordered by their shape (see _shape) and then by where each
+    of their variables occurs across the clause. Variants that only deeper
+    structure tells apart may still differ; subsumption removes those."""
+    literals = list(dict.fromkeys(literals))
+    atoms = set()
+    for lit in literals:
+        if (lit.predicate, lit.parameters) in atoms:
+            # Both polarities, as duplicates are merged already
+            return None
+        atoms.add((lit.predicate, lit.parameters))
+    shapes = [_shape(lit) for lit in literals]
+    occurrences: Dict[Parameter, List[Tuple[Tuple, int]]] = {}
+    for shape, lit in zip(shapes, literals):
+        for i, p in enumerate(lit.parameters):
+            if p.is_var:
+                occurrences.setdefault(p, []).append((shape, i))
+    if not occurrences:
+        return Sentence.from_literals(
+            [literals[k] for k in sorted(range(len(literals)),
+                                         key=shapes.__getitem__)])
+    for found in occurrences.values():
+        found.sort()
+    keys = [(shape, [occurrences[p] for p in lit.parameters if p.is_var])
+            for shape, lit in zip(shapes, literals)]
+    order = sorted(range(len(literals)), key=keys.__getitem__)
+    return Sentence.from_literals(
+        rename_variables([literals[k] for k in order], standard_variable))
+
+
+def standardize_apart(sentence: Sentence) -> Sentence:
+    """Copy of sentence whose variables cannot clash with a stored sentence."""
+    if sentence.contains_only_constants():
+        return sentence
+    return Sentence.from_literals(
+        rename_variables(sentence.disjoint_literals, apart_variable))
+
+
+def resolve(sent1: Sentence, sent2: Sentence, i: int, j: int,
+            subst: Substitution) -> Optional[Sentence]:
+    """Resolvent of sent1 and sent2 upon their i-th and j-th literals in
+    canonical form, or None if it is a tautology."""
+    literals = [subst.apply(l) for k, l in enumerate(sent1.disjoint_literals)
+                if k != i]
+    literals += [subst.apply(l) for k, l in enumerate(sent2.disjoint_literals)
+                 if k != j]
+    return canonical_clause(literals)
+
+
+def factors(sentence: Sentence) -> List[Sentence]:
+    """The factors of sentence in canonical form: the clauses obtained by
+    unifying two of its literals of the same predicate and polarity. Binary
+    resolution needs them to be complete, e.g. to refute P(x) | P(y) with
+    ~P(u) | ~P(v). Factors of factors are left to the caller."""
+    found: Dict[Sentence, None] = {}
+    literals = sentence.disjoint_literals
+    for i, lit1 in enumerate(literals):
+        for lit2 in literals[i + 1:]:
+            if lit1.predicate != lit2.predicate or \
+                    lit1.negated != lit2.negated:
+                continue
+            subst = unify(lit1, lit2)
+            if subst is None:
+                continue
+            factor = canonical_clause([subst.apply(l) for l in literals])
+            if factor is not None:
+                found[factor] = None
+    return list(found)
+
+
+def resolvents(sent1: Sentence, sent2: Sentence,
+               metrics=None) -> List[Sentence]:
+    """All binary resolvents of two sentences that share no variables,
+    tautologies left out. The empty sentence is returned for a
+    contradiction. Unification attempts and their timings are recorded on a
+    QueryMetrics when one is given."""
+    if metrics is not None:
+        return _counted_resolvents(sent1, sent2, metrics)
+    results = []
+    for i, lit1 in enumerate(sent1.disjoint_literals):
+        for j, lit2 in enumerate(sent2.disjoint_literals):
+            if lit1.predicate == lit2.predicate and \
+                    lit1.negated != lit2.negated:
+                subst = unify(lit1, lit2)
+                if subst is not None:
+                    result = resolve(sent1, sent2, i, j, subst)
+                    if result is not None:
+                        results.append(result)
+    return results
+
+
+def _counted_resolvents(sent1: Sentence, sent2: Sentence,
+                        metrics) -> List[Sentence]:
+    results = []
+    for i, lit1 in enumerate(sent1.disjoint_literals):
+        for j, lit2 in enumerate(sent2.disjoint_literals):
+            if lit1.predicate == lit2.predicate and \
+                    lit1.negated != lit2.negated:
+                start = time.perf_counter()
+                subst = unify(lit1, lit2)
+                start = metrics.add_time("unify", start)
+                metrics.unifications += 1
+                if subst is None:
+                    metrics.unifications_failed += 1
+                    continue
+                result = resolve(sent1, sent2, i, j, subst)
+                metrics.add_time("resolve", start)
+                if result is not None:
+                    results.append(result)
+    metrics.resolvents += len(results)
+    return results
+
+
+def unify_and_resolve(sent1: Sentence, sent2: Sentence) -> List[Sentence]:
+    return resolvents(sent1, standardize_apart(sent2))